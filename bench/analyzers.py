@@ -0,0 +1,111 @@
+"""
+Compares the BM25 analyzers (lib/analyzer.py) on a fixed corpus.
+
+For every analyzer it reports fit throughput (analysis + index build), query
+latency and retrieval quality (MRR@10 and hit@10) on synthetic queries. Each
+query is a few words sampled from one chunk, half of them with their
+inflection changed; the relevant chunks are the ones containing all the
+sampled words. The default corpus is the pydoc text of a fixed list of
+standard library modules; pass --corpus to use any text file instead.
+
+    python bench/analyzers.py [--corpus FILE] [--queries 300] [--json]
+"""
+import argparse
+import importlib
+import json
+import os
+import pydoc
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.analyzer import ANALYZERS
+from lib.bm25 import BM25Retriever
+from lib.config import CHUNK_SIZE, OVERLAP
+from lib.utils import chunk_text
+
+MODULES = ["argparse", "collections", "csv", "json", "logging", "os", "pathlib", "re",
+           "sqlite3", "subprocess", "threading", "unittest", "urllib.request", "zipfile"]
+
+WORD = re.compile(r"[a-z]{4,}")
+
+def build_corpus(path=None):
+    if path:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    else:
+        text = "\n".join(pydoc.render_doc(importlib.import_module(m), renderer=pydoc.plaintext) for m in MODULES)
+    return chunk_text(text, CHUNK_SIZE, overlap=OVERLAP)
+
+def inflect(word):
+    if word.endswith("s"):
+        return word[:-1]
+    if word.endswith("e"):
+        return word + "d"
+    return word + "s"
+
+def build_queries(chunks, n, seed=0):
+    rng = random.Random(seed)
+    lowered = [c.lower() for c in chunks]
+    queries = []
+    while len(queries) < n:
+        i = rng.randrange(len(chunks))
+        words = sorted(set(WORD.findall(lowered[i])))
+        if len(words) < 4:
+            continue
+        sampled = rng.sample(words, 4)
+        relevant = {j for j, c in enumerate(lowered) if all(w in c for w in sampled)}
+        query = " ".join(inflect(w) if k % 2 else w for k, w in enumerate(sampled))
+        queries.append((query, relevant))
+    return queries
+
+def evaluate(name, chunks, queries):
+    start = time.perf_counter()
+    retriever = BM25Retriever(analyzer=name).fit(chunks)
+    fit_s = time.perf_counter() - start
+
+    reciprocal_ranks, hits = [], 0
+    start = time.perf_counter()
+    for query, relevant in queries:
+        ids, _ = retriever.top_k(query, 10)
+        rank = next((r for r, i in enumerate(ids.tolist(), 1) if i in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0)
+        hits += rank is not None
+    query_s = time.perf_counter() - start
+
+    return {
+        "analyzer": name,
+        "chunks": len(chunks),
+        "fit_s": round(fit_s, 3),
+        "fit_chunks_per_s": round(len(chunks) / fit_s, 1),
+        "query_ms": round(1000 * query_s / len(queries), 3),
+        "mrr@10": round(sum(reciprocal_ranks) / len(queries), 4),
+        "hit@10": round(hits / len(queries), 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="text file to use as corpus")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--analyzers", nargs="+", default=sorted(ANALYZERS))
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    options = parser.parse_args()
+
+    chunks = build_corpus(options.corpus)
+    queries = build_queries(chunks, options.queries)
+    results = [evaluate(name, chunks, queries) for name in options.analyzers]
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = list(results[0])
+    print("  ".join(f"{c:>16}" for c in columns))
+    for result in results:
+        print("  ".join(f"{result[c]:>16}" for c in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Import-time budget for the metadata-only xpl commands.
+
+Runs each command under `python -X importtime` and fails (exit code 1) if it
+imports one of the heavy modules of the pipeline or if its imports take longer
+than the budget. Commands run in a temporary directory, with a config whose
+stores (databases, indexes, caches) all live there, so the tree is untouched:
+
+    python bench/import_time.py [--budget-ms 250]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = [
+    ["--help"],
+    ["config"],
+    ["dbs"],
+    ["ls", "."],
+    ["cache"],
+]
+
+HEAVY = ("chromadb", "nltk", "markitdown", "numpy")
+
+def setup_workspace(workspace):
+    """Writes a config keeping every store in `workspace` and returns the environment pointing at it."""
+    with open(os.path.join(ROOT, "config.toml")) as f:
+        config = toml.load(f)
+    config["document_processing"]["chroma_path"] = os.path.join(workspace, "chroma")
+    config["document_processing"]["checkpoint_path"] = os.path.join(workspace, "checkpoints")
+    config["vector_store"]["path"] = os.path.join(workspace, "vectors")
+    config["bm25"]["bm25_path"] = os.path.join(workspace, "bm25")
+    config["cache"]["cache_path"] = os.path.join(workspace, "cache")
+    config["daemon"]["socket_path"] = os.path.join(workspace, "xpl.sock")
+    path = os.path.join(workspace, "config.toml")
+    with open(path, "w") as f:
+        toml.dump(config, f)
+    return dict(os.environ, XPL_CONFIG=path)
+
+def measure(args, workspace, env):
+    """
+    Runs `xpl <args>` with -X importtime in `workspace`.
+
+    Returns:
+        (float, float, set): import time and wall time in ms, top-level packages imported.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(ROOT, "xpl"), *args],
+        cwd=workspace, env=env, capture_output=True, text=True
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"xpl {' '.join(args)} failed:\n{result.stderr}")
+
+    imports_us = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented, top-level ones already include them
+        if not name.startswith("  "):
+            imports_us += int(cumulative)
+        packages.add(name.strip().split(".")[0])
+    return imports_us / 1000, wall, packages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=250, help="import time budget per command")
+    options = parser.parse_args()
+
+    failed = False
+    print(f"{'command':<12} {'imports ms':>10} {'wall ms':>9}  heavy modules")
+    with tempfile.TemporaryDirectory(prefix="xpl-bench-") as workspace:
+        env = setup_workspace(workspace)
+        for args in COMMANDS:
+            imports_ms, wall_ms, packages = measure(args, workspace, env)
+            heavy = sorted(p for p in packages if p in HEAVY)
+            over = imports_ms > options.budget_ms
+            failed |= over or bool(heavy)
+            print(f"{' '.join(args):<12} {imports_ms:>10.1f} {wall_ms:>9.1f}  {', '.join(heavy) or '-'}"
+                  f"{'  OVER BUDGET' if over else ''}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
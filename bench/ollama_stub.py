@@ -0,0 +1,139 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks that must run offline.
+
+Serves /api/embed (batched), /api/embeddings (legacy, one prompt) and
+/api/generate (plain or NDJSON stream). Embeddings are deterministic hashed
+bags of words, so texts sharing words get similar vectors; generations are a
+fixed number of words derived from the prompt, wrapped in the JSON structure
+xpl asks for. Every request can be delayed to imitate a real model.
+
+    python bench/ollama_stub.py [--port 11434] [--embed-latency-ms 20] [--token-latency-ms 5]
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORD = re.compile(r"\w+")
+
+class Options:
+    dim = 384
+    embed_latency = 0.0     # seconds per /api/embed or /api/embeddings request
+    embed_item_latency = 0.0  # extra seconds per embedded text
+    generate_latency = 0.0  # seconds before the first token
+    token_latency = 0.0     # seconds per generated token
+    tokens = 64             # generated tokens (words) per response
+
+def embedding(text, dim):
+    """Hashed bag of words, L2 normalized."""
+    vector = [0.0] * dim
+    for word in WORD.findall(text.lower()):
+        h = zlib.crc32(word.encode())
+        vector[h % dim] += 1.0 if h & (1 << 31) else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def completion(prompt, tokens):
+    """Deterministic words picked from the prompt, as a JSON answer split in tokens."""
+    words = WORD.findall(prompt) or ["empty"]
+    seed = zlib.crc32(prompt.encode())
+    picked = [words[(seed + i * 7919) % len(words)] for i in range(tokens)]
+    text = json.dumps({"answer": " ".join(picked)})
+    n = max(1, tokens)
+    return text, [text[i * len(text) // n:(i + 1) * len(text) // n] for i in range(n)]
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = Options
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_chunk(self, payload):
+        line = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        options = self.options
+        if self.path == "/api/embed":
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(options.embed_latency + options.embed_item_latency * len(texts))
+            self.send_json({"model": body.get("model"), "embeddings": [embedding(t, options.dim) for t in texts]})
+        elif self.path == "/api/embeddings":
+            time.sleep(options.embed_latency + options.embed_item_latency)
+            self.send_json({"embedding": embedding(body.get("prompt", ""), options.dim)})
+        elif self.path == "/api/generate":
+            text, pieces = completion(body.get("prompt", ""), options.tokens)
+            time.sleep(options.generate_latency)
+            if not body.get("stream", True):
+                time.sleep(options.token_latency * len(pieces))
+                self.send_json({"model": body.get("model"), "response": text, "done": True})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for piece in pieces:
+                time.sleep(options.token_latency)
+                self.send_chunk({"model": body.get("model"), "response": piece, "done": False})
+            self.send_chunk({"model": body.get("model"), "response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_error(404)
+
+def start(port=0, **options):
+    """
+    Starts the stand-in server in a daemon thread.
+
+    Args:
+        port (int): Port to listen on, 0 for any free one.
+        **options: Overrides of the `Options` attributes.
+
+    Returns:
+        ThreadingHTTPServer: The running server (`server_address` has the port).
+    """
+    handler = type("Handler", (Handler,), {"options": type("Options", (Options,), options)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=Options.dim)
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--embed-item-latency-ms", type=float, default=0)
+    parser.add_argument("--generate-latency-ms", type=float, default=0)
+    parser.add_argument("--token-latency-ms", type=float, default=0)
+    parser.add_argument("--tokens", type=int, default=Options.tokens)
+    options = parser.parse_args()
+
+    server = start(
+        options.port, dim=options.dim, tokens=options.tokens,
+        embed_latency=options.embed_latency_ms / 1000, embed_item_latency=options.embed_item_latency_ms / 1000,
+        generate_latency=options.generate_latency_ms / 1000, token_latency=options.token_latency_ms / 1000,
+    )
+    print(f"Ollama stand-in listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+End-to-end benchmark of document processing and question answering.
+
+Runs fully offline: the Ollama API is replaced by bench/ollama_stub.py and
+every store (Chroma, BM25, cache) lives in a temporary workspace with its own
+config file (through XPL_CONFIG). Synthetic .md and .txt documents of the
+requested sizes are generated, processed with `process_document` and queried
+with `answer_question`, and the time of every stage (the lib.profile spans,
+two levels deep) is reported, e.g.:
+
+    process: extract, summary, tokenize, embed, store.add, bm25.index, bm25.fit, bm25.save
+    ask:     retrieve, retrieve/embed_query, retrieve/search, llm
+
+along with the peak RSS of the process after every document (documents are
+processed from the smallest to the largest, so it shows how memory scales).
+
+Results are printed (or written with --output) as JSON; --compare prints the
+relative change of every timing against an earlier result file.
+
+    python bench/pipeline.py [--sizes 10KB 1MB 50MB] [--formats md txt] [--questions 5]
+                             [--embed-latency-ms 0] [--token-latency-ms 0] [--output FILE] [--compare FILE]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+import toml
+
+import ollama_stub
+
+UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "B": 1}
+VOCABULARY = 5000
+
+def parse_size(size):
+    for unit, factor in UNITS.items():
+        if size.upper().endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
+
+def write_document(path, size, markdown=True, questions=5, seed=0):
+    """
+    Writes about `size` bytes of Zipf-distributed words from a fixed synthetic
+    vocabulary, in paragraphs, under numbered headings when `markdown`.
+    Paragraphs are written as they are generated, so memory stays flat.
+
+    Returns:
+        list: `questions` questions, each about a few words of one paragraph.
+    """
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(VOCABULARY)]
+    cum_weights = list(accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+
+    sampled, length, n = [], 0, 0
+    with open(path, "w") as f:
+        while length < size:
+            if markdown and n % 10 == 0:
+                length += f.write(f"## Section {n // 10 + 1}\n\n")
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(40, 120))
+            length += f.write(" ".join(words).capitalize() + ".\n\n")
+            # reservoir sample of the paragraphs the questions are about
+            if len(sampled) < questions:
+                sampled.append(words)
+            elif rng.randrange(n + 1) < questions:
+                sampled[rng.randrange(questions)] = words
+            n += 1
+    return ["What does the document say about " + " ".join(rng.sample(words, 4)) + "?" for words in sampled]
+
+def setup_workspace(workspace, url, options):
+    """Writes the benchmark config and points lib.config at it. Must run before importing lib."""
+    with open(os.path.join(os.path.dirname(ROOT), "config.toml")) as f:
+        config = toml.load(f)
+    config["embedding_model"]["api_url"] = url + "/api/embed"
+    config["llm_model"]["api_url"] = url + "/api/generate"
+    config["document_processing"]["chroma_path"] = os.path.join(workspace, "chroma")
+    config["document_processing"]["checkpoint_path"] = os.path.join(workspace, "checkpoints")
+    config["vector_store"]["path"] = os.path.join(workspace, "vectors")
+    config["bm25"]["bm25_path"] = os.path.join(workspace, "bm25")
+    config["bm25"]["analyzer"] = options.analyzer
+    config["cache"]["cache_path"] = os.path.join(workspace, "cache")
+    config["cache"]["embeddings"] = options.cache
+    config["cache"]["answers"] = options.cache
+    config["cache"]["extractions"] = options.cache
+    config["daemon"]["socket_path"] = os.path.join(workspace, "xpl.sock")
+
+    path = os.path.join(workspace, "config.toml")
+    with open(path, "w") as f:
+        toml.dump(config, f)
+    os.environ["XPL_CONFIG"] = path
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+def stage_times(depth=2):
+    """Seconds spent in every span path up to `depth` levels, since the last call."""
+    import lib.profile
+
+    times = dict()
+    for path, _, seconds in lib.profile.tree():
+        if len(path) <= depth:
+            times["/".join(path)] = round(seconds, 4)
+    lib.profile.reset()
+    return times
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def run(docs, options):
+    import lib.processor
+    import lib.profile
+    import lib.query
+
+    lib.profile.enable()
+    results = []
+    for path, questions in docs:
+        print(f"{os.path.basename(path)}: processing", file=sys.stderr)
+        lib.profile.reset()
+        start = time.perf_counter()
+        chunks = lib.processor.process_document(path)
+        process_s = time.perf_counter() - start
+        process_stages = stage_times()
+        rss = peak_rss_mb()
+
+        ask_s, ask_stages = [], defaultdict(float)
+        for question in questions:
+            start = time.perf_counter()
+            lib.query.answer_question(path, question, on_token=(lambda piece: None) if options.stream else None)
+            ask_s.append(time.perf_counter() - start)
+            for stage, seconds in stage_times().items():
+                ask_stages[stage] += seconds / len(questions)
+
+        results.append({
+            "name": os.path.basename(path),
+            "bytes": os.path.getsize(path),
+            "chunks": chunks,
+            "process_s": round(process_s, 4),
+            "process_stages_s": process_stages,
+            "peak_rss_mb": rss,
+            "ask_s": round(sum(ask_s) / len(ask_s), 4) if ask_s else None,
+            "ask_stages_s": {stage: round(seconds, 4) for stage, seconds in ask_stages.items()},
+        })
+    return results
+
+def timings(result):
+    """Flattens the timings of one document result."""
+    flat = {"process": result["process_s"], "ask": result["ask_s"]}
+    flat.update({"process." + k: v for k, v in result["process_stages_s"].items()})
+    flat.update({"ask." + k: v for k, v in result["ask_stages_s"].items()})
+    return flat
+
+def compare(baseline, current):
+    before = {r["name"]: timings(r) for r in baseline["documents"]}
+    print(f"{'document':<16} {'timing':<24} {'before s':>10} {'after s':>10} {'change':>8}")
+    for result in current["documents"]:
+        if result["name"] not in before:
+            continue
+        for key, value in timings(result).items():
+            old = before[result["name"]].get(key)
+            if old is None or value is None:
+                continue
+            change = f"{(value - old) / old:+.1%}" if old else "-"
+            print(f"{result['name']:<16} {key:<24} {old:>10.4f} {value:>10.4f} {change:>8}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["10KB", "100KB", "1MB"], help="document sizes, up to 50MB")
+    parser.add_argument("--formats", nargs="+", default=["md", "txt"], choices=["md", "txt"])
+    parser.add_argument("--questions", type=int, default=5, help="questions asked per document")
+    parser.add_argument("--stream", action="store_true", help="stream the answers")
+    parser.add_argument("--analyzer", default="fast", help="BM25 analyzer (nltk needs its data installed)")
+    parser.add_argument("--cache", action="store_true", help="keep the embedding, answer and extraction caches enabled")
+    parser.add_argument("--dim", type=int, default=ollama_stub.Options.dim, help="embedding dimension")
+    parser.add_argument("--embed-latency-ms", type=float, default=0, help="latency of every embedding request")
+    parser.add_argument("--embed-item-latency-ms", type=float, default=0, help="extra latency per embedded text")
+    parser.add_argument("--generate-latency-ms", type=float, default=0, help="latency before the first token")
+    parser.add_argument("--token-latency-ms", type=float, default=0, help="latency of every generated token")
+    parser.add_argument("--tokens", type=int, default=ollama_stub.Options.tokens, help="tokens per generation")
+    parser.add_argument("--workdir", help="workspace to use instead of a temporary directory")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    options = parser.parse_args()
+
+    server = ollama_stub.start(
+        dim=options.dim, tokens=options.tokens,
+        embed_latency=options.embed_latency_ms / 1000, embed_item_latency=options.embed_item_latency_ms / 1000,
+        generate_latency=options.generate_latency_ms / 1000, token_latency=options.token_latency_ms / 1000,
+    )
+    workspace = options.workdir or tempfile.mkdtemp(prefix="xpl-bench-")
+    os.makedirs(os.path.join(workspace, "docs"), exist_ok=True)
+    setup_workspace(workspace, f"http://127.0.0.1:{server.server_address[1]}", options)
+
+    docs = []
+    for n, size in enumerate(sorted(options.sizes, key=parse_size)):
+        for fmt in options.formats:
+            path = os.path.join(workspace, "docs", f"doc-{size}.{fmt}")
+            docs.append((path, write_document(path, parse_size(size), fmt == "md", options.questions, seed=n)))
+
+    results = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workspace": workspace,
+            "options": {k: v for k, v in vars(options).items() if k not in ("output", "compare", "workdir")},
+        },
+        "documents": None,
+    }
+    # the pipeline prints progress, keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results["documents"] = run(docs, options)
+    server.shutdown()
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
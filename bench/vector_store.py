@@ -0,0 +1,147 @@
+"""
+Compares the vector store backends (lib/db) on synthetic embeddings.
+
+For Chroma and the flat store (float16 and int8) it reports the time to
+build a collection, the time to open it and answer the first query in a
+fresh process (what `xpl ask` pays), the query latency of a warm collection,
+the size on disk and the recall@k of the top hits against exact float32
+search. Vectors are clustered random unit vectors, queries are noisy copies
+of stored vectors.
+
+    python bench/vector_store.py [--vectors 100000] [--dim 384] [--queries 200] [--k 100] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import toml
+
+BACKENDS = {"chroma": ("chroma", "float16"), "flat-float16": ("flat", "float16"), "flat-int8": ("flat", "int8")}
+DB = "/bench"
+COLLECTION = "vectors.md"
+
+def setup_workspace(workspace, backend, dtype):
+    """Writes a config using `backend` and points lib.config at it. Must run before importing lib."""
+    with open(os.path.join(ROOT, "config.toml")) as f:
+        config = toml.load(f)
+    config["document_processing"]["chroma_path"] = os.path.join(workspace, "chroma")
+    config["vector_store"].update(backend=backend, path=os.path.join(workspace, "vectors"), dtype=dtype)
+    path = os.path.join(workspace, "config.toml")
+    with open(path, "w") as f:
+        toml.dump(config, f)
+    os.environ["XPL_CONFIG"] = path
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+def make_data(n, dim, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = vectors[rng.integers(n, size=queries)]
+    query_vectors = picked + 0.1 * rng.standard_normal(picked.shape).astype(np.float32)
+    return vectors, query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+def exact_top_k(vectors, queries, k):
+    scores = queries @ vectors.T
+    return [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in scores]
+
+def disk_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+def build(vectors, batch_size):
+    """Builds the collection in the current process (the workspace is already set up)."""
+    from lib.db import get_client, get_or_create_collection
+
+    collection, _ = get_or_create_collection(get_client(DB), COLLECTION)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        ids = [f"{COLLECTION}_{i}" for i in range(start, start + len(batch))]
+        collection.add(ids=ids, embeddings=batch.tolist(), documents=[f"chunk {i}" for i in range(start, start + len(batch))])
+    return collection
+
+def search(collection, queries, k):
+    hits = []
+    for query in queries:
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+        hits.append({int(id.rsplit("_", 1)[1]) for id in result["ids"][0]})
+    return hits
+
+def cold_query(workspace, query):
+    """Opens the collection and answers one query in a fresh process: seconds."""
+    code = (
+        "import sys, time; start = time.perf_counter(); sys.path.insert(0, %r)\n"
+        "from lib.db import get_collection\n"
+        "get_collection(%r, %r).query(query_embeddings=[%r], n_results=10)\n"
+        "print(time.perf_counter() - start)" % (ROOT, DB, COLLECTION, query.tolist())
+    )
+    result = subprocess.run([sys.executable, "-c", code], env=os.environ, capture_output=True, text=True, check=True)
+    return float(result.stdout.split()[-1])
+
+def evaluate(name, workspace, vectors, queries, k, batch_size):
+    start = time.perf_counter()
+    collection = build(vectors, batch_size)
+    build_s = time.perf_counter() - start
+
+    search(collection, queries[:5], k)  # warm up
+    start = time.perf_counter()
+    hits = search(collection, queries, k)
+    query_s = time.perf_counter() - start
+
+    exact = exact_top_k(vectors, queries, k)
+    recall = sum(len(h & e) for h, e in zip(hits, exact)) / sum(len(e) for e in exact)
+    return {
+        "backend": name,
+        "vectors": len(vectors),
+        "build_s": round(build_s, 3),
+        "cold_query_s": round(cold_query(workspace, queries[0]), 3),
+        "query_ms": round(1000 * query_s / len(queries), 3),
+        "disk_mb": round(disk_size(workspace) / (1 << 20), 1),
+        f"recall@{k}": round(recall, 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=100, help="hits per query (the retrieval candidates)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--backend", help=argparse.SUPPRESS)  # one backend in a child process
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    options = parser.parse_args()
+
+    if options.backend:
+        workspace = tempfile.mkdtemp(prefix="xpl-bench-")
+        setup_workspace(workspace, *BACKENDS[options.backend])
+        vectors, queries = make_data(options.vectors, options.dim, options.queries)
+        print(json.dumps(evaluate(options.backend, workspace, vectors, queries, options.k, options.batch_size)))
+        return
+
+    # every backend runs in its own process, lib.config is read once per process
+    results = []
+    for backend in options.backends:
+        args = [sys.executable, __file__, "--backend", backend, "--vectors", str(options.vectors),
+                "--dim", str(options.dim), "--queries", str(options.queries), "--k", str(options.k),
+                "--batch-size", str(options.batch_size)]
+        output = subprocess.run(args, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = list(results[0])
+    print("  ".join(f"{c:>14}" for c in columns))
+    for result in results:
+        print("  ".join(f"{result[c]:>14}" for c in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import re
+from functools import lru_cache
+
+# Analyzers turn text into BM25 terms. The analyzer used to fit an index is
+# recorded in it, so queries are always analyzed the same way.
+#
+#   nltk: word_tokenize + perceptron POS tagging + WordNet lemmatization
+#         (tagging batched with pos_tag_sents, lemmas memoized per (token, POS))
+#   fast: regex tokenization + a light suffix stemmer, no POS tagging
+
+maps = {
+    "NN": "n",
+    "NNS": "n",
+    "NNP": "n",
+    "NNPS": "n",
+    "VB": "v",
+    "VBD": "v",
+    "VBG": "v",
+    "VBN": "v",
+    "VBP": "v",
+    "VBZ": "v",
+    "JJ": "a",
+    "JJR": "a",
+    "JJS": "a",
+    "RB": "r",
+    "RBR": "r",
+    "RBS": "r",
+    "DT": "n",
+    "PRP$": "n",
+    "PRP": "n"
+}
+
+_lemmatizer = None
+
+def get_lemmatizer():
+    # nltk is imported on first use, not when the module is imported
+    global _lemmatizer
+    if _lemmatizer is None:
+        from nltk.stem import WordNetLemmatizer
+        _lemmatizer = WordNetLemmatizer()
+    return _lemmatizer
+
+@lru_cache(maxsize=1 << 16)
+def lemmatize(token, pos):
+    return get_lemmatizer().lemmatize(token.lower(), maps.get(pos, "n"))
+
+class NltkAnalyzer:
+    name = "nltk"
+
+    def analyze(self, text):
+        return self.analyze_many([text])[0]
+
+    def analyze_many(self, texts):
+        """
+        Analyzes many texts, tagging them in one pos_tag_sents batch.
+
+        Args:
+            texts (list): List of text strings.
+
+        Returns:
+            list: The term list of every text.
+        """
+        from nltk import pos_tag_sents, word_tokenize
+
+        tagged = pos_tag_sents([word_tokenize(text) for text in texts])
+        return [[lemmatize(word, pos) for word, pos in sentence] for sentence in tagged]
+
+TOKEN = re.compile(r"[^\W_]+")
+
+@lru_cache(maxsize=1 << 16)
+def light_stem(word):
+    """
+    Light English stemmer: plural forms (the S-stemmer rules) and -ing/-ed.
+
+    Args:
+        word (str): A lowercase token.
+
+    Returns:
+        str: The stem.
+    """
+    if len(word) > 3 and word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes", "zzes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("us", "ss")):
+        return word[:-1]
+    for suffix, min_len in (("ing", 6), ("ed", 5)):
+        if len(word) >= min_len and word.endswith(suffix) and not word.endswith("eed"):
+            stem = word[:-len(suffix)]
+            if not any(c in "aeiouy" for c in stem):
+                return word
+            # running -> run, stopped -> stop
+            if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in "lsz":
+                stem = stem[:-1]
+            return stem
+    return word
+
+class FastAnalyzer:
+    name = "fast"
+
+    def analyze(self, text):
+        return [light_stem(token) for token in TOKEN.findall(text.lower())]
+
+    def analyze_many(self, texts):
+        return [self.analyze(text) for text in texts]
+
+ANALYZERS = {
+    NltkAnalyzer.name: NltkAnalyzer(),
+    FastAnalyzer.name: FastAnalyzer(),
+}
+
+def get_analyzer(name):
+    """
+    Args:
+        name (str): "nltk" or "fast".
+
+    Returns:
+        The analyzer instance.
+    """
+    try:
+        return ANALYZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown BM25 analyzer {name!r}, expected one of {sorted(ANALYZERS)}.")
@@ -1,116 +1,596 @@
+import bisect
 import hashlib
-import os
 import json
-import math
-from nltk.stem import WordNetLemmatizer
-from nltk import pos_tag, word_tokenize
-from lib.config import BM25_PATH
-
-lemmatizer = WordNetLemmatizer()
-
-maps = {
-    "NN": "n",
-    "NNS": "n",
-    "NNP": "n",
-    "NNPS": "n",
-    "VB": "v",
-    "VBD": "v",
-    "VBG": "v",
-    "VBN": "v",
-    "VBP": "v",
-    "VBZ": "v",
-    "JJ": "a",
-    "JJR": "a",
-    "JJS": "a",
-    "RB": "r",
-    "RBR": "r",
-    "RBS": "r",
-    "DT": "n",
-    "PRP$": "n",
-    "PRP": "n"
-}
+import os
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+from lib.config import BM25_PATH, MAX_INDEXES, BM25_ANALYZER
+from lib.analyzer import get_analyzer
 
 def clean(sentence):
-    return [lemmatizer.lemmatize(word.lower(), maps.get(pos, "n")) for word, pos in pos_tag(word_tokenize(sentence))]
+    # the original analyzer, kept for callers that tokenize outside an index
+    return get_analyzer("nltk").analyze(sentence)
 
 class BM25Retriever:
+    """
+    Okapi BM25 over an inverted index.
 
-    def __init__(self, b=0.75, k1=1.5):
+    The index is stored CSR-style: the postings of the term with row `r` in
+    `vocab` are `doc_ids[indptr[r]:indptr[r+1]]` with term frequencies
+    `tfs[indptr[r]:indptr[r+1]]`, sorted by doc id. Scoring only touches the
+    postings of the query terms. Docs and queries are turned into terms by
+    the analyzer the index was built with (see lib/analyzer.py).
+    """
+
+    def __init__(self, b=0.75, k1=1.5, analyzer=BM25_ANALYZER):
         self.b = b
         self.k1 = k1
+        self.analyzer = analyzer
+        self._analyzer = get_analyzer(analyzer)
         self.N = 0
         self.avg_dl = 0
-        self.df = dict()
-        self.docs = dict()
-        
-    
+        self.vocab = dict()
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.int32)
+        self.doc_len = np.zeros(0, dtype=np.int32)
+
     def fit(self, docs):
         # receives a list of docs,
         # first clean them of syntactical sugar
-        cleaned = [clean(d) for d in docs]
-        # id = doc position
-        for i, doc_words in enumerate(cleaned):
-            d = len(doc_words)
-            self.avg_dl += d
-            self.docs[str(i)] = {"length": d, "fdt": dict()}
-            for word in doc_words:
-                self.docs[str(i)]["fdt"][word] = self.docs[str(i)]["fdt"].get(word, 0) + 1
-                self.df[word] = self.df.get(word, 0) + 1
-
-            self.N += 1
-        
-        self.avg_dl /= self.N 
+        return self.fit_tokens(self._analyzer.analyze_many(docs))
+
+    def fit_tokens(self, tokenized_docs):
+        """
+        Builds the index from already tokenized docs (id = doc position).
+
+        Args:
+            tokenized_docs (list): List of token lists.
 
+        Returns:
+            BM25Retriever: self
+        """
+        return self.fit_postings(PostingsBuilder().add(tokenized_docs))
+
+    def fit_postings(self, postings):
+        """
+        Builds the index from a `PostingsBuilder` filled batch by batch.
+
+        Args:
+            postings (PostingsBuilder): The accumulated postings.
+
+        Returns:
+            BM25Retriever: self
+        """
+        self._build(*postings.arrays())
         return self
 
+    def update(self, changed, n_docs):
+        """
+        Updates the index in place for an edited document.
+
+        Args:
+            changed (dict): doc id -> new text, for every added or modified doc.
+            n_docs (int): New number of docs; docs with an id >= n_docs are dropped.
+
+        Returns:
+            BM25Retriever: self
+        """
+        tokens = self._analyzer.analyze_many(list(changed.values()))
+        return self.update_tokens(dict(zip(changed, tokens)), n_docs)
+
+    def update_tokens(self, changed, n_docs):
+        """
+        Updates the index from already tokenized docs, without refitting.
+
+        Only the postings of the changed and dropped docs are touched: they are
+        removed, the new postings are appended and df, N and avg_dl follow
+        from the resulting arrays.
+
+        Args:
+            changed (dict): doc id -> token list, for every added or modified doc.
+            n_docs (int): New number of docs; docs with an id >= n_docs are dropped.
+
+        Returns:
+            BM25Retriever: self
+        """
+        vocab = dict(self.vocab.items())
+        rows = np.repeat(np.arange(len(vocab), dtype=np.int64), self.df)
+        docs = np.asarray(self.doc_ids)
+        keep = ~(np.isin(docs, np.fromiter(changed, dtype=np.int32, count=len(changed))) | (docs >= n_docs))
+
+        doc_len = np.zeros(n_docs, dtype=np.int32)
+        kept = min(n_docs, self.N)
+        doc_len[:kept] = self.doc_len[:kept]
+        new_rows, new_docs, new_tfs = [], [], []
+        for i, doc_words in changed.items():
+            doc_len[i] = len(doc_words)
+            for word, tf in Counter(doc_words).items():
+                new_rows.append(vocab.setdefault(word, len(vocab)))
+                new_docs.append(i)
+                new_tfs.append(tf)
+
+        rows = np.concatenate([rows[keep], np.array(new_rows, dtype=np.int64)])
+        docs = np.concatenate([docs[keep], np.array(new_docs, dtype=np.int32)])
+        tfs = np.concatenate([np.asarray(self.tfs)[keep], np.array(new_tfs, dtype=np.int32)])
+
+        # drop the terms that no longer occur in any doc
+        used = np.bincount(rows, minlength=len(vocab)) > 0
+        remap = np.cumsum(used) - 1
+        vocab = {term: int(remap[row]) for term, row in vocab.items() if used[row]}
+        self._build(vocab, remap[rows], docs, tfs, doc_len)
+        return self
+
+    def _build(self, vocab, rows, docs, tfs, doc_len):
+        """Lays out (term row, doc, tf) triplets as CSR postings."""
+        order = np.lexsort((docs, rows))
+        self.vocab = vocab
+        self.indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(vocab)), out=self.indptr[1:])
+        self.doc_ids = docs[order]
+        self.tfs = tfs[order]
+        self.doc_len = doc_len
+        self.N = len(doc_len)
+        self.avg_dl = float(doc_len.mean()) if self.N else 0
+
+    @property
+    def df(self):
+        """Document frequency of every term, indexed by vocab row."""
+        return np.diff(self.indptr)
+
+    def postings(self, term: str):
+        """
+        Returns the postings of a term.
+
+        Args:
+            term (str): A cleaned term.
+
+        Returns:
+            (np.ndarray, np.ndarray): doc ids and term frequencies (empty if the term is unknown).
+        """
+        row = self.vocab.get(term)
+        if row is None:
+            return self.doc_ids[:0], self.tfs[:0]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def _idf(self, dft):
+        return np.log10(1 + ((self.N - dft) / (dft + 0.5)))
+
+    def _tf(self, ids, fdt):
+        fdt = fdt.astype(np.float64)
+        return (fdt * (self.k1 + 1)) / (fdt + self.k1 * (1 - self.b + self.b * (self.doc_len[ids] / self.avg_dl)))
+
+    def _contributions(self, terms):
+        """Yields (doc ids, scores) for the postings of every distinct query term."""
+        for term, qtf in Counter(terms).items():
+            ids, fdt = self.postings(term)
+            if len(ids):
+                yield ids, qtf * self._idf(len(ids)) * self._tf(ids, fdt)
+
     def score_term(self, doc: str, term: str):
-        fdt = self.docs[doc]["fdt"].get(term,0)
-        dft = self.df.get(term,0)
-        # term is supposed to be a word
-        idf = math.log10(1 + ((self.N - dft)/(dft+0.5)))
-        tf = (fdt*(self.k1 +1))/(fdt + self.k1*(1 - self.b + self.b*(self.N/self.avg_dl)))
+        ids, fdt = self.postings(term)
+        pos = np.searchsorted(ids, int(doc))
+        if pos == len(ids) or ids[pos] != int(doc):
+            return 0.0
+        return float(self._idf(len(ids)) * self._tf(ids[pos:pos + 1], fdt[pos:pos + 1])[0])
 
-        return tf*idf
-    
     def score_query(self, query: str):
-        clean_q = clean(query)
-        # for all docs get the sum over terms
-        scores = []
-        for i in range(self.N):
-            scores.append(sum(self.score_term(str(i), term) for term in clean_q))
-        
+        """
+        Scores every doc against the query.
+
+        Args:
+            query (str): The user query.
+
+        Returns:
+            np.ndarray: Dense array of N scores, indexed by doc id.
+        """
+        scores = np.zeros(self.N, dtype=np.float64)
+        for ids, contrib in self._contributions(self._analyzer.analyze(query)):
+            scores[ids] += contrib
         return scores
 
+    def score_docs(self, query: str, doc_ids):
+        """
+        Scores only the given docs against the query.
+
+        Args:
+            query (str): The user query.
+            doc_ids (array-like): Doc ids to score.
+
+        Returns:
+            np.ndarray: The score of every doc in `doc_ids`.
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        scores = np.zeros(len(doc_ids), dtype=np.float64)
+        for term, qtf in Counter(self._analyzer.analyze(query)).items():
+            ids, fdt = self.postings(term)
+            if not len(ids):
+                continue
+            pos = np.minimum(np.searchsorted(ids, doc_ids), len(ids) - 1)
+            found = ids[pos] == doc_ids
+            scores[found] += qtf * self._idf(len(ids)) * self._tf(doc_ids[found], fdt[pos[found]])
+        return scores
+
+    def top_k(self, query: str, k: int):
+        """
+        Scores only the docs sharing a term with the query and keeps the best k.
+
+        Args:
+            query (str): The user query.
+            k (int): Number of docs to return.
+
+        Returns:
+            (np.ndarray, np.ndarray): doc ids and scores, best first.
+        """
+        parts = list(self._contributions(self._analyzer.analyze(query)))
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64)
+        ids, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate([p[1] for p in parts]))
+        if k < len(ids):
+            best = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order]
+
+    def save(self, file_path=""):
+        """Save the BM25 model in the binary index format (see `_save_to`)."""
+        self._save_to(index_path(file_path))
+
+    def _save_to(self, path):
+        """
+        Writes the model to `path` in the binary index format.
+
+        Layout: an 8 byte magic, the header length as a little endian uint64,
+        a JSON header (parameters and array offsets) and then the arrays, each
+        8 byte aligned. The vocabulary is stored as a sorted UTF-8 blob with an
+        offsets array, and the postings rows follow that sorted order.
+        """
+        terms = sorted((term.encode(), row) for term, row in self.vocab.items())
+        old_rows = np.array([row for _, row in terms], dtype=np.int64)
+        df = self.df[old_rows]
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        # gather the postings of every old row in the new (sorted) row order
+        gather = np.repeat(self.indptr[old_rows] - indptr[:-1], df) + np.arange(indptr[-1])
+
+        vocab_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term, _ in terms], out=vocab_offsets[1:])
+        arrays = {
+            "vocab_offsets": vocab_offsets,
+            "vocab_blob": np.frombuffer(b"".join(term for term, _ in terms), dtype=np.uint8),
+            "indptr": indptr,
+            "doc_ids": np.asarray(self.doc_ids[gather], dtype=np.int32),
+            "tfs": np.asarray(self.tfs[gather], dtype=np.int32),
+            "doc_len": np.asarray(self.doc_len, dtype=np.int32),
+        }
+        _write_index(path, {
+            "version": INDEX_VERSION,
+            "analyzer": self.analyzer,
+            "b": self.b,
+            "k1": self.k1,
+            "N": self.N,
+            "avg_dl": self.avg_dl,
+        }, arrays)
+
+    @staticmethod
+    def load(file_path=""):
+        """
+        Load a BM25 model from the binary index through `np.memmap`.
+
+        Only the header is read eagerly; vocabulary lookups and postings page
+        in the parts of the file they touch. Falls back to (and converts) a
+        legacy JSON model if no binary index exists yet.
+        """
+        path = index_path(file_path)
+        if not os.path.exists(path) and os.path.exists(json_path(file_path)):
+            convert_json_index(json_path(file_path))
+        header, arrays = _read_index(path)
+
+        obj = BM25Retriever(b=header["b"], k1=header["k1"], analyzer=header.get("analyzer", "nltk"))
+        obj.N = header["N"]
+        obj.avg_dl = header["avg_dl"]
+        obj.vocab = MappedVocab(arrays["vocab_offsets"], arrays["vocab_blob"])
+        obj.indptr = arrays["indptr"]
+        obj.doc_ids = arrays["doc_ids"]
+        obj.tfs = arrays["tfs"]
+        obj.doc_len = arrays["doc_len"]
+        return obj
+
     def save_json(self, file_path=""):
         """Save the BM25 model to a JSON file."""
+        terms = list(self.vocab)
+        docs = {str(i): {"length": int(d), "fdt": dict()} for i, d in enumerate(self.doc_len)}
+        for term, row in self.vocab.items():
+            start, end = self.indptr[row], self.indptr[row + 1]
+            for doc, tf in zip(self.doc_ids[start:end].tolist(), self.tfs[start:end].tolist()):
+                docs[str(doc)]["fdt"][term] = tf
         data = {
+            "analyzer": self.analyzer,
             "b": self.b,
             "k1": self.k1,
             "N": self.N,
             "avg_dl": self.avg_dl,
-            "df": self.df,
-            "docs": self.docs,
+            "df": dict(zip(terms, self.df.tolist())),
+            "docs": docs,
         }
-        loc = hashlib.sha256(file_path.encode()).hexdigest()
-        with open(BM25_PATH+f"/{loc}.json", "w") as f:
+        os.makedirs(BM25_PATH, exist_ok=True)
+        with open(json_path(file_path), "w") as f:
             json.dump(data, f)
     
     @staticmethod
     def load_json(file_path=""):
         """Load a BM25 model from a JSON file."""
-        loc = hashlib.sha256(file_path.encode()).hexdigest()
-        with open(BM25_PATH+f"/{loc}.json", "r") as f:
-            data = json.load(f)
-        
-        obj = BM25Retriever(b=data["b"], k1=data["k1"])
-        obj.N = data["N"]
-        obj.avg_dl = data["avg_dl"]
-        obj.df = data["df"]
-        obj.docs = data["docs"]
-        return obj
-    
+        return _from_json(json_path(file_path))
 
-def delete_bm25_collection(filename):
-    loc = hashlib.sha256(os.path.abspath(filename).encode()).hexdigest()
-    os.remove(BM25_PATH+f"/{loc}.json")
 
+class PostingsBuilder:
+    """
+    Accumulates the (term row, doc, tf) triplets of tokenized docs, batch by
+    batch, as compact NumPy arrays (doc ids continue across batches).
+
+    Every batch can be saved on its own (`save_batch`) and the builder
+    rebuilt from the saved batches (`load_batch`), which is how an
+    interrupted ingestion keeps its BM25 state (see lib/checkpoint.py).
+    """
+
+    def __init__(self):
+        self.vocab = dict()
+        self.n_docs = 0
+        self._rows, self._docs, self._tfs, self._doc_len = [], [], [], []
+        self._words = []  # the vocab terms, in row order
+        self._batch_words = 0  # rows that existed before the last batch
+
+    def add(self, tokenized_docs):
+        """
+        Args:
+            tokenized_docs (list): Token lists of the next docs.
+
+        Returns:
+            PostingsBuilder: self
+        """
+        vocab, words = self.vocab, self._words
+        self._batch_words = len(words)
+        rows, docs, tfs = [], [], []
+        doc_len = []
+        for i, doc_words in enumerate(tokenized_docs, self.n_docs):
+            doc_len.append(len(doc_words))
+            for word, tf in Counter(doc_words).items():
+                row = vocab.get(word)
+                if row is None:
+                    row = vocab[word] = len(words)
+                    words.append(word)
+                rows.append(row)
+                docs.append(i)
+                tfs.append(tf)
+
+        self.n_docs += len(doc_len)
+        self._rows.append(np.array(rows, dtype=np.int64))
+        self._docs.append(np.array(docs, dtype=np.int32))
+        self._tfs.append(np.array(tfs, dtype=np.int32))
+        self._doc_len.append(np.array(doc_len, dtype=np.int32))
+        return self
+
+    def save_batch(self, path):
+        """Writes the postings of the last `add`, with the terms it introduced, to `path` (.npz)."""
+        words = "\0".join(self._words[self._batch_words:]).encode("utf-8")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, words=np.frombuffer(words, dtype=np.uint8), rows=self._rows[-1], docs=self._docs[-1],
+                     tfs=self._tfs[-1], doc_len=self._doc_len[-1])
+        os.replace(tmp, path)
+
+    def load_batch(self, path):
+        """
+        Appends a batch written by `save_batch`; batches must be loaded in the order they were added.
+
+        Returns:
+            PostingsBuilder: self
+        """
+        with np.load(path) as batch:
+            words = batch["words"].tobytes().decode("utf-8")
+            self._batch_words = len(self._words)
+            for word in words.split("\0") if words else []:
+                self.vocab[word] = len(self._words)
+                self._words.append(word)
+            self._rows.append(batch["rows"])
+            self._docs.append(batch["docs"])
+            self._tfs.append(batch["tfs"])
+            self._doc_len.append(batch["doc_len"])
+        self.n_docs += len(self._doc_len[-1])
+        return self
+
+    def arrays(self):
+        """Returns (vocab, rows, docs, tfs, doc_len) as expected by `BM25Retriever._build`."""
+        def concat(parts, dtype):
+            return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+        return (self.vocab, concat(self._rows, np.int64), concat(self._docs, np.int32),
+                concat(self._tfs, np.int32), concat(self._doc_len, np.int32))
+
+
+class MappedVocab:
+    """
+    Read-only term -> row mapping over a sorted, memory-mapped vocabulary blob.
+
+    Lookups are a binary search, so only the few terms compared are paged in.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def get(self, term, default=None):
+        key = term.encode()
+        row = bisect.bisect_left(self, key)
+        if row < len(self) and self[row] == key:
+            return row
+        return default
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row].decode()
+
+    def items(self):
+        for row in range(len(self)):
+            yield self[row].decode(), row
+
+
+INDEX_MAGIC = b"XPLBM25\0"
+INDEX_VERSION = 1
+
+def index_path(file_path):
+    loc = hashlib.sha256(file_path.encode()).hexdigest()
+    return BM25_PATH+f"/{loc}.xbm"
+
+def json_path(file_path):
+    loc = hashlib.sha256(file_path.encode()).hexdigest()
+    return BM25_PATH+f"/{loc}.json"
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _write_index(path, header, arrays):
+    """Writes header + arrays to `path` atomically (via a temporary file)."""
+    header = dict(header, arrays=dict())
+    # offsets depend on the header length, so iterate until the header is stable
+    raw = b""
+    while True:
+        offset = _align(len(INDEX_MAGIC) + 8 + len(raw))
+        for name, arr in arrays.items():
+            header["arrays"][name] = [offset, arr.dtype.str, len(arr)]
+            offset = _align(offset + arr.nbytes)
+        encoded = json.dumps(header).encode()
+        if encoded == raw:
+            break
+        raw = encoded
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(INDEX_MAGIC)
+        f.write(len(raw).to_bytes(8, "little"))
+        f.write(raw)
+        for name, arr in arrays.items():
+            f.seek(header["arrays"][name][0])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(_align(f.tell()))
+    os.replace(tmp, path)
+
+def _read_index(path):
+    """Reads the header of a binary index and memory-maps its arrays."""
+    with open(path, "rb") as f:
+        if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            raise ValueError(f"{path} is not an xpl BM25 index.")
+        header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+    arrays = dict()
+    for name, (offset, dtype, length) in header["arrays"].items():
+        if length == 0:
+            arrays[name] = np.zeros(0, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(length,))
+    return header, arrays
+
+def _from_json(path):
+    """Builds a BM25Retriever from a legacy JSON model file."""
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    # models written before analyzers were configurable all used nltk
+    obj = BM25Retriever(b=data["b"], k1=data["k1"], analyzer=data.get("analyzer", "nltk"))
+    vocab = dict()
+    rows, docs, tfs = [], [], []
+    doc_len = np.zeros(data["N"], dtype=np.int32)
+    for doc, entry in data["docs"].items():
+        doc_len[int(doc)] = entry["length"]
+        for word, tf in entry["fdt"].items():
+            rows.append(vocab.setdefault(word, len(vocab)))
+            docs.append(int(doc))
+            tfs.append(tf)
+    obj._build(vocab, np.array(rows, dtype=np.int64), np.array(docs, dtype=np.int32),
+               np.array(tfs, dtype=np.int32), doc_len)
+    return obj
+
+def convert_json_index(path, remove=True):
+    """
+    Converts a legacy `.xplbm25/<hash>.json` model to the binary format.
+
+    Args:
+        path (str): Path of the JSON model.
+        remove (bool): Deletes the JSON file once the binary index is written.
+
+    Returns:
+        str: Path of the binary index.
+    """
+    out = path[:-len(".json")] + ".xbm"
+    obj = _from_json(path)
+    # the binary file shares the JSON file's hash, so write it directly
+    obj._save_to(out)
+    if remove:
+        os.remove(path)
+    return out
+
+def convert_json_indexes(remove=True):
+    """
+    Converts every legacy JSON model under BM25_PATH to the binary format.
+
+    Returns:
+        list: Paths of the written binary indexes.
+    """
+    if not os.path.isdir(BM25_PATH):
+        return []
+    return [convert_json_index(os.path.join(BM25_PATH, name), remove=remove)
+            for name in sorted(os.listdir(BM25_PATH)) if name.endswith(".json")]
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+def get_retriever(file_path, max_indexes=MAX_INDEXES):
+    """
+    Returns the BM25 model of a document, keeping the `max_indexes` most
+    recently used ones loaded.
+
+    An entry is reloaded if its index file was rewritten since it was loaded.
+
+    Args:
+        file_path (str): Absolute path of the document.
+        max_indexes (int): Number of loaded models to keep.
+
+    Returns:
+        BM25Retriever: The loaded model.
+    """
+    path = index_path(file_path)
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    with _loaded_lock:
+        entry = _loaded.get(file_path)
+        if entry is not None and entry[0] == mtime:
+            _loaded.move_to_end(file_path)
+            return entry[1]
+
+    retriever = BM25Retriever.load(file_path=file_path)
+    with _loaded_lock:
+        _loaded[file_path] = (os.stat(path).st_mtime_ns, retriever)
+        _loaded.move_to_end(file_path)
+        while len(_loaded) > max_indexes:
+            _loaded.popitem(last=False)
+    return retriever
+
+def index_exists(file_path):
+    """True if the document has a BM25 model, binary or legacy JSON."""
+    return os.path.exists(index_path(file_path)) or os.path.exists(json_path(file_path))
+
+def delete_bm25_collection(filename):
+    path = os.path.abspath(filename)
+    with _loaded_lock:
+        _loaded.pop(path, None)
+    # an interrupted document has no index yet
+    for index in (json_path(path), index_path(path)):
+        if os.path.exists(index):
+            os.remove(index)
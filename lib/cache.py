@@ -0,0 +1,445 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from lib.config import (CACHE_PATH, CACHE_MAX_EMBEDDINGS, CACHE_EMBEDDING_TTL, CACHE_MAX_ANSWERS, CACHE_ANSWER_TTL,
+                        CACHE_MAX_EXTRACTION_MB)
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (embedding model, chunk text hash).
+
+    Backed by a SQLite file; vectors are stored as float32 blobs. Once the
+    cache holds more than `max_entries` vectors, the least recently used ones
+    are evicted, and vectors unused for `ttl` seconds expire (0 keeps them).
+    Query embeddings go through the same cache as chunk embeddings.
+    Hit/miss counters are kept per process (`hits`, `misses`) and accumulated
+    in the database (`stats()`).
+    """
+
+    def __init__(self, path=None, max_entries=CACHE_MAX_EMBEDDINGS, ttl=CACHE_EMBEDDING_TTL):
+        if path is None:
+            os.makedirs(CACHE_PATH, exist_ok=True)
+            path = os.path.join(CACHE_PATH, "embeddings.sqlite3")
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # estimate of the number of entries, so the size cap is not checked with a
+        # full COUNT(*) on every insert (see put_many)
+        self._entries = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0);
+        """)
+        self._conn.commit()
+
+    def get_many(self, model, texts):
+        """
+        Looks up the embeddings of `texts`.
+
+        Args:
+            model (str): The embedding model.
+            texts (list): List of text strings.
+
+        Returns:
+            list: The cached embedding of every text, or None where it is missing.
+        """
+        hashes = [text_hash(t) for t in texts]
+        found = dict()
+        now = time.time()
+        oldest = now - self.ttl if self.ttl else 0
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = list(set(hashes[start:start + 500]))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND last_used >= ? "
+                    f"AND hash IN ({','.join('?' * len(part))})",
+                    [model, oldest, *part]
+                )
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+
+            hits = sum(1 for h in hashes if h in found)
+            self.hits += hits
+            self.misses += len(hashes) - hits
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                                   [(now, model, h) for h in found])
+            self._conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                                   [(hits, "hits"), (len(hashes) - hits, "misses")])
+            self._conn.commit()
+        return [found.get(h) for h in hashes]
+
+    def put_many(self, model, texts, embeddings):
+        """
+        Stores embeddings, evicting the least recently used entries above the size cap.
+
+        The entries are counted once, then estimated from the inserts and the
+        expired entries; the estimate runs high when an insert replaces an
+        entry and low when other processes insert, so entries are only counted
+        again, and evicted, once it exceeds the cap.
+
+        Args:
+            model (str): The embedding model.
+            texts (list): List of text strings.
+            embeddings (list): Their embeddings, in the same order.
+        """
+        now = time.time()
+        rows = [(model, text_hash(t), array("f", e).tobytes(), now) for t, e in zip(texts, embeddings)]
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._count()
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._entries += len(rows)
+            if self.ttl:
+                self._entries -= self._conn.execute("DELETE FROM embeddings WHERE last_used < ?", (now - self.ttl,)).rowcount
+            if self._entries > self.max_entries:
+                self._entries = self._count()
+                excess = self._entries - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE (model, hash) IN "
+                        "(SELECT model, hash FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                    )
+                    self._entries = self.max_entries
+            self._conn.commit()
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of cached entries and the accumulated hit/miss counters.
+        """
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats"))
+            stats["entries"] = self._count()
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("UPDATE stats SET value = 0")
+            self._entries = 0
+            self._conn.commit()
+
+class AnswerCache:
+    """
+    Persistent cache of LLM responses to questions about a document.
+
+    Entries are keyed by a scope (see `lib.query.answer_scope`: the document,
+    the hash of its indexed content, the LLM and the retrieval settings) and
+    the whitespace-normalized question. With a similarity threshold, a
+    question missing from the cache is also answered by the cached question
+    of the same scope whose embedding is the most similar, if it is at least
+    that similar. Entries expire `ttl` seconds after they were stored (0
+    keeps them), the least recently used ones are evicted above
+    `max_entries`, and `invalidate` drops every entry of a document.
+    """
+
+    def __init__(self, path=None, max_entries=CACHE_MAX_ANSWERS, ttl=CACHE_ANSWER_TTL):
+        if path is None:
+            os.makedirs(CACHE_PATH, exist_ok=True)
+            path = os.path.join(CACHE_PATH, "answers.sqlite3")
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                scope TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                document TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (scope, hash)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS answers_document ON answers (document);
+            CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0);
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(question):
+        return " ".join(question.split())
+
+    def _similar(self, scope, embedding, threshold, oldest):
+        """The hash of the most similar cached question of `scope`, if similar enough."""
+        import numpy as np
+
+        rows = self._conn.execute(
+            "SELECT hash, embedding FROM answers WHERE scope = ? AND created >= ? AND embedding IS NOT NULL",
+            (scope, oldest)
+        ).fetchall()
+        if not rows:
+            return None
+        cached = np.array([array("f", blob) for _, blob in rows], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(cached, axis=1) * np.linalg.norm(query)
+        similarities = cached @ query / np.where(norms == 0, 1, norms)
+        best = int(np.argmax(similarities))
+        return rows[best][0] if similarities[best] >= threshold else None
+
+    def get(self, scope, question, embedding=None, threshold=0):
+        """
+        Looks up the response to a question.
+
+        Args:
+            scope (str): The cache scope of the document.
+            question (str): The question.
+            embedding (list): The question embedding, for the similarity lookup.
+            threshold (float): Minimum cosine similarity of a cached question
+                to reuse its response, 0 for exact matches only.
+
+        Returns:
+            str: The cached response, or None.
+        """
+        key = text_hash(self.normalize(question))
+        now = time.time()
+        oldest = now - self.ttl if self.ttl else 0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM answers WHERE scope = ? AND hash = ? AND created >= ?", (scope, key, oldest)
+            ).fetchone()
+            if row is None and threshold and embedding is not None:
+                key = self._similar(scope, embedding, threshold, oldest)
+                if key is not None:
+                    row = self._conn.execute(
+                        "SELECT response FROM answers WHERE scope = ? AND hash = ?", (scope, key)
+                    ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE answers SET last_used = ? WHERE scope = ? AND hash = ?", (now, scope, key))
+            self._conn.execute("UPDATE stats SET value = value + 1 WHERE name = ?", ("hits" if row else "misses",))
+            self._conn.commit()
+        return row[0] if row else None
+
+    def put(self, scope, document, question, response, embedding=None):
+        """
+        Stores a response, dropping expired entries and evicting the least
+        recently used ones above the size cap.
+
+        Args:
+            scope (str): The cache scope of the document.
+            document (str): Absolute path of the document, for `invalidate`.
+            question (str): The question.
+            response (str): The LLM response.
+            embedding (list): The question embedding, for similarity lookups.
+        """
+        question = self.normalize(question)
+        blob = array("f", embedding).tobytes() if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (scope, text_hash(question), document, question, blob, response, now, now))
+            if self.ttl:
+                self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM answers WHERE (scope, hash) IN "
+                    "(SELECT scope, hash FROM answers ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self._conn.commit()
+
+    def invalidate(self, document):
+        """
+        Drops the cached answers about a document (after it was reprocessed).
+
+        Args:
+            document (str): Path of the document.
+
+        Returns:
+            int: Number of dropped answers.
+        """
+        with self._lock:
+            dropped = self._conn.execute("DELETE FROM answers WHERE document = ?", (os.path.abspath(document),)).rowcount
+            self._conn.commit()
+        return dropped
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of cached answers and the accumulated hit/miss counters.
+        """
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats"))
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.execute("UPDATE stats SET value = 0")
+            self._conn.commit()
+
+class ExtractionCache:
+    """
+    Persistent cache of the markdown extracted from documents, keyed by
+    (file content hash, markitdown version).
+
+    Texts are stored zlib-compressed in a SQLite file; once they take more
+    than `max_bytes` (compressed), the least recently used ones are evicted.
+    The file is shared by the worker processes that fill it (`xpl warm`).
+    """
+
+    def __init__(self, path=None, max_bytes=CACHE_MAX_EXTRACTION_MB << 20):
+        if path is None:
+            os.makedirs(CACHE_PATH, exist_ok=True)
+            path = os.path.join(CACHE_PATH, "extractions.sqlite3")
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                hash TEXT NOT NULL,
+                version TEXT NOT NULL,
+                text BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (hash, version)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0);
+        """)
+        self._conn.commit()
+
+    def get(self, file_hash, version):
+        """
+        Args:
+            file_hash (str): The sha256 of the document.
+            version (str): The markitdown version.
+
+        Returns:
+            str: The cached markdown, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM extractions WHERE hash = ? AND version = ?", (file_hash, version)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE extractions SET last_used = ? WHERE hash = ? AND version = ?",
+                                   (time.time(), file_hash, version))
+            self._conn.execute("UPDATE stats SET value = value + 1 WHERE name = ?", ("hits" if row else "misses",))
+            self._conn.commit()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def contains(self, file_hash, version):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM extractions WHERE hash = ? AND version = ?", (file_hash, version)
+            ).fetchone() is not None
+
+    def put(self, file_hash, version, text):
+        """
+        Stores a text, evicting the least recently used ones above the size cap.
+
+        Args:
+            file_hash (str): The sha256 of the document.
+            version (str): The markitdown version.
+            text (str): The extracted markdown.
+        """
+        blob = zlib.compress(text.encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)",
+                               (file_hash, version, blob, len(blob), time.time()))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+            for key_hash, key_version, size in self._conn.execute(
+                "SELECT hash, version, size FROM extractions ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM extractions WHERE hash = ? AND version = ?", (key_hash, key_version))
+                total -= size
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of cached texts, their compressed size and the accumulated hit/miss counters.
+        """
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats"))
+            stats["entries"], stats["bytes"] = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions")
+            self._conn.execute("UPDATE stats SET value = 0")
+            self._conn.commit()
+
+_embedding_cache = None
+_answer_cache = None
+_extraction_cache = None
+_extraction_pid = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """
+    Returns:
+        EmbeddingCache: The process-wide embedding cache.
+    """
+    global _embedding_cache
+    with _cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+def get_answer_cache():
+    """
+    Returns:
+        AnswerCache: The process-wide answer cache.
+    """
+    global _answer_cache
+    with _cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+    return _answer_cache
+
+def get_extraction_cache():
+    """
+    Returns:
+        ExtractionCache: The extraction cache of this process (worker
+        processes forked from one that used it open their own connection).
+    """
+    global _extraction_cache, _extraction_pid
+    with _cache_lock:
+        if _extraction_cache is None or _extraction_pid != os.getpid():
+            _extraction_cache = ExtractionCache()
+            _extraction_pid = os.getpid()
+    return _extraction_cache
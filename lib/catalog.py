@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import sqlite3
+from lib.config import CHROMA_PATH, VECTOR_STORE, VECTOR_STORE_PATH
+
+# Read-only view of the databases and collections of the vector store, read
+# straight from Chroma's SQLite catalog (or the json files of the flat store).
+# Metadata-only commands (`xpl ls`, `xpl dbs`) use it to avoid importing
+# chromadb or numpy; every function returns None if the catalog can't be
+# read, in which case callers fall back to lib.db.
+
+def _query(sql, params=()):
+    path = os.path.join(CHROMA_PATH, "chroma.sqlite3")
+    if not os.path.exists(path):
+        return []
+    try:
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+            return conn.execute(sql, params).fetchall()
+    except sqlite3.Error:
+        return None
+
+def _flat_db_path(folderpath):
+    return os.path.join(VECTOR_STORE_PATH, hashlib.sha256(os.path.abspath(folderpath).encode()).hexdigest())
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def list_dbs():
+    """
+    Lists dbs existing in the xpl tenant.
+
+    Returns:
+        list: dicts with the id, name and tenant of every database, or None.
+    """
+    if VECTOR_STORE == "flat":
+        if not os.path.isdir(VECTOR_STORE_PATH):
+            return []
+        dbs = [(entry.name, _read_json(os.path.join(entry.path, "db.json"))) for entry in os.scandir(VECTOR_STORE_PATH)]
+        return sorted(({"id": id, "name": db["name"], "tenant": "xpl"} for id, db in dbs if db), key=lambda db: db["name"])
+    rows = _query("SELECT id, name, tenant_id FROM databases WHERE tenant_id = 'xpl' ORDER BY name")
+    if rows is None:
+        return None
+    return [{"id": id, "name": name, "tenant": tenant} for id, name, tenant in rows]
+
+def db_exists(folderpath):
+    """
+    Checks if db exists for a folder.
+
+    Args:
+        folderpath (str): The folder path.
+
+    Returns:
+        bool: True if the corresponding db exists, or None.
+    """
+    if VECTOR_STORE == "flat":
+        return os.path.exists(os.path.join(_flat_db_path(folderpath), "db.json"))
+    rows = _query("SELECT 1 FROM databases WHERE tenant_id = 'xpl' AND name = ?", (os.path.abspath(folderpath),))
+    if rows is None:
+        return None
+    return bool(rows)
+
+def list_collections(folderpath):
+    """
+    Lists the collections (processed documents) of a folder's database.
+
+    Args:
+        folderpath (str): The folder path.
+
+    Returns:
+        list: Collection names (empty if the folder has no database), or None.
+    """
+    if VECTOR_STORE == "flat":
+        path = _flat_db_path(folderpath)
+        if not os.path.isdir(path):
+            return []
+        metas = [_read_json(os.path.join(entry.path, "meta.json")) for entry in os.scandir(path) if entry.is_dir()]
+        return sorted(meta["name"] for meta in metas if meta)
+    rows = _query(
+        "SELECT c.name FROM collections c JOIN databases d ON c.database_id = d.id "
+        "WHERE d.tenant_id = 'xpl' AND d.name = ? ORDER BY c.name",
+        (os.path.abspath(folderpath),)
+    )
+    if rows is None:
+        return None
+    return [name for (name,) in rows]
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import shutil
+from lib.config import CHECKPOINT_PATH
+from lib.bm25 import PostingsBuilder
+
+# Progress of the documents being processed, so that an interrupted run
+# (a crash, an Ollama restart, Ctrl-C) resumes where it stopped instead of
+# leaving a half-made collection behind. One directory per document:
+#
+#   state.json        the settings the progress is valid for (file hash,
+#                     chunking, analyzer, models), the summary or the state
+#                     of the summary in progress, and the chunks committed
+#   postings-N.npz    the BM25 postings of the N-th committed batch
+#
+# A batch is first added to the vector store, then its postings are written,
+# then state.json is replaced, so the state never counts chunks that are not
+# stored; chunks stored past it are dropped on resume.
+
+def checkpoint_dir(filepath):
+    return os.path.join(CHECKPOINT_PATH, hashlib.sha256(os.path.abspath(filepath).encode()).hexdigest())
+
+def exists(filepath):
+    """
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        bool: True if the document was not completely processed.
+    """
+    return os.path.exists(os.path.join(checkpoint_dir(filepath), "state.json"))
+
+def remove(filepath):
+    """Drops the saved progress of a document, e.g. when its collection is deleted."""
+    shutil.rmtree(checkpoint_dir(filepath), ignore_errors=True)
+
+class Checkpoint:
+    """
+    The saved progress of one document.
+
+    Args:
+        filepath (str): Path to the document.
+        state (dict): The content of state.json.
+    """
+
+    def __init__(self, filepath, state):
+        self.filepath = os.path.abspath(filepath)
+        self.path = checkpoint_dir(filepath)
+        self.state = state
+
+    @staticmethod
+    def load(filepath, stored=None):
+        """
+        Args:
+            filepath (str): Path to the document.
+            stored (int): Number of chunks in the document's collection. A
+                checkpoint counting more chunks than that is stale (the
+                collection was deleted or rebuilt since) and is ignored.
+
+        Returns:
+            Checkpoint: The saved progress of the document, or None.
+        """
+        try:
+            with open(os.path.join(checkpoint_dir(filepath), "state.json")) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if stored is not None and state["chunks"] > stored:
+            return None
+        return Checkpoint(filepath, state)
+
+    @staticmethod
+    def start(filepath, settings):
+        """
+        Starts the progress of a document from scratch.
+
+        Args:
+            filepath (str): Path to the document.
+            settings (dict): What the progress is valid for; see `matches`.
+
+        Returns:
+            Checkpoint: The new checkpoint.
+        """
+        shutil.rmtree(checkpoint_dir(filepath), ignore_errors=True)
+        os.makedirs(checkpoint_dir(filepath))
+        checkpoint = Checkpoint(filepath, {"file": os.path.abspath(filepath), "settings": settings,
+                                           "summary": None, "summary_state": None, "chunks": 0, "batches": 0})
+        checkpoint._save()
+        return checkpoint
+
+    def _save(self):
+        path = os.path.join(self.path, "state.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(path + ".tmp", path)
+
+    def matches(self, settings):
+        """True if the progress was made with the same file content and settings."""
+        return self.state["settings"] == json.loads(json.dumps(settings))
+
+    @property
+    def summary(self):
+        return self.state["summary"]
+
+    @property
+    def summary_state(self):
+        return self.state["summary_state"]
+
+    @property
+    def chunks(self):
+        return self.state["chunks"]
+
+    def save_summary_state(self, summary_state):
+        self.state["summary_state"] = summary_state
+        self._save()
+
+    def save_summary(self, summary):
+        self.state["summary"] = summary
+        self.state["summary_state"] = None
+        self._save()
+
+    def commit(self, chunks, postings):
+        """
+        Records a batch stored in the vector store.
+
+        Args:
+            chunks (int): Number of chunks stored so far.
+            postings (PostingsBuilder): The postings, the batch added last.
+        """
+        postings.save_batch(os.path.join(self.path, f"postings-{self.state['batches']}.npz"))
+        self.state["batches"] += 1
+        self.state["chunks"] = chunks
+        self._save()
+
+    def postings(self):
+        """
+        Returns:
+            PostingsBuilder: The postings of the committed batches.
+        """
+        postings = PostingsBuilder()
+        for n in range(self.state["batches"]):
+            postings.load_batch(os.path.join(self.path, f"postings-{n}.npz"))
+        return postings
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -1,8 +1,8 @@
 import os
 import toml
 
-# Define the path to the configuration file
-CONFIG_FILE_PATH = os.path.dirname(__file__)+'/../config.toml'
+# Define the path to the configuration file (XPL_CONFIG overrides it, e.g. for bench/pipeline.py)
+CONFIG_FILE_PATH = os.environ.get('XPL_CONFIG', os.path.dirname(__file__)+'/../config.toml')
 
 # Load the configuration file
 with open(CONFIG_FILE_PATH, 'r') as config_file:
@@ -11,21 +11,63 @@ with open(CONFIG_FILE_PATH, 'r') as config_file:
 # Accessing the configurations
 EMBEDDING_MODEL = config['embedding_model']['name']
 EMBEDDING_API_URL = config['embedding_model']['api_url']
+EMBEDDING_BATCH_SIZE = config['embedding_model']['batch_size']
+EMBEDDING_CONCURRENCY = config['embedding_model']['concurrency']
+EMBEDDING_MAX_RETRIES = config['embedding_model']['max_retries']
+EMBEDDING_RETRY_BACKOFF = config['embedding_model']['retry_backoff']
 
 LLM_MODEL = config['llm_model']['name']
 LLM_API_URL = config['llm_model']['api_url']
+LLM_CONCURRENCY = config['llm_model']['concurrency']
 
 CHUNK_SIZE = config['document_processing']['chunk_size']
 OVERLAP = config['document_processing']['overlap'] 
+PARENT_SIZE = config['document_processing']['parent_size']
 CHROMA_PATH = config['document_processing']['chroma_path']
+WORKERS = config['document_processing']['workers']
+INGEST_BATCH_SIZE = config['document_processing']['batch_size']
+CHECKPOINT_PATH = config['document_processing']['checkpoint_path']
+
+VECTOR_STORE = config['vector_store']['backend']
+VECTOR_STORE_PATH = config['vector_store']['path']
+VECTOR_STORE_DTYPE = config['vector_store']['dtype']
 
 S_CHUNK_SIZE = config['summary']['chunk_size']
 S_OVERLAP = config['summary']['overlap'] 
 MAX_SUMMARY_LEN = config['summary']['max_summary_length']
+S_STRATEGY = config['summary']['strategy']
+S_FAN_IN = config['summary']['fan_in']
 
 BM25_PATH = config['bm25']['bm25_path']
 ALPHA = config['bm25']['alpha']
+BM25_ANALYZER = config['bm25']['analyzer']
 
 N_DOCS = config['query']['n_docs']
+STREAM = config['query']['stream']
+RETRIEVAL = config['query']['retrieval']
+CANDIDATES = config['query']['candidates']
+FUSION = config['query']['fusion']
+RRF_K = config['query']['rrf_k']
+QUERY_WORKERS = config['query']['workers']
+FOLDER_SUMMARIES = config['query']['folder_summaries']
+
+CONTEXT_TOKENS = config['context']['token_budget']
+CHARS_PER_TOKEN = config['context']['chars_per_token']
+RESPONSE_TOKENS = config['context']['response_tokens']
+MAX_CTX = config['context']['max_ctx']
+
+CACHE_PATH = config['cache']['cache_path']
+CACHE_EMBEDDINGS = config['cache']['embeddings']
+CACHE_MAX_EMBEDDINGS = config['cache']['max_embeddings']
+CACHE_EMBEDDING_TTL = config['cache']['embedding_ttl']
+CACHE_ANSWERS = config['cache']['answers']
+CACHE_MAX_ANSWERS = config['cache']['max_answers']
+CACHE_ANSWER_TTL = config['cache']['answer_ttl']
+CACHE_ANSWER_SIMILARITY = config['cache']['answer_similarity']
+CACHE_EXTRACTIONS = config['cache']['extractions']
+CACHE_MAX_EXTRACTION_MB = config['cache']['max_extraction_mb']
+
+SOCKET_PATH = config['daemon']['socket_path']
+MAX_INDEXES = config['daemon']['max_indexes']
 
 LOGGING_LEVEL = config['logging']['level']
@@ -0,0 +1,119 @@
+from lib.config import CONTEXT_TOKENS, CHARS_PER_TOKEN, RESPONSE_TOKENS, MAX_CTX
+from lib.profile import span, count
+
+# Context assembly for the answer prompts. Chunk i of a document starts at
+# character i * (chunk_size - overlap) (see lib.utils.iter_chunks), so hits
+# whose character ranges overlap or touch are stitched into one contiguous
+# span without repeating the overlap. Spans are then packed, best first, into
+# a token budget. Token counts are estimated from the character count, as
+# the model's tokenizer is not available locally.
+
+MIN_CTX = 2048
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def stitch(hits, chunk_size=None, overlap=None):
+    """
+    Merges the hits of one document into contiguous spans.
+
+    Args:
+        hits (list): (chunk id, score, text) of every retrieved chunk.
+        chunk_size (int): The chunk size the document was processed with.
+        overlap (int): The overlap it was processed with. Without both,
+            every hit is its own span.
+
+    Returns:
+        list: (score, chunk ids, text) of every span, the score being the best of its chunks.
+    """
+    if chunk_size is None or overlap is None or chunk_size <= overlap:
+        return [(score, [id], text) for id, score, text in hits]
+
+    step = chunk_size - overlap
+    spans = []
+    end = None
+    for id, score, text in sorted(hits, key=lambda hit: hit[0]):
+        start = id * step
+        if spans and start <= end:
+            best, ids, stitched = spans[-1]
+            spans[-1] = (max(best, score), ids + [id], stitched + text[end - start:])
+            end = max(end, start + len(text))
+        else:
+            spans.append((score, [id], text))
+            end = start + len(text)
+    return spans
+
+def pack(spans, budget=CONTEXT_TOKENS):
+    """
+    Picks spans by decreasing score while they fit the token budget. The best
+    span is always kept, cut to the budget if it does not fit on its own.
+
+    Args:
+        spans (list): (score, ..., text) tuples, the text last.
+        budget (int): Tokens available for the context.
+
+    Returns:
+        list: The picked spans, best first.
+    """
+    picked, used = [], 0
+    for s in sorted(spans, key=lambda s: -s[0]):
+        tokens = estimate_tokens(s[-1])
+        if used + tokens <= budget:
+            picked.append(s)
+            used += tokens
+        elif not picked:
+            picked.append(s[:-1] + (s[-1][:budget * CHARS_PER_TOKEN],))
+            used = budget
+    return picked
+
+def build_context(hits, budget=CONTEXT_TOKENS):
+    """
+    Builds the numbered context of a prompt from the retrieved chunks.
+
+    Args:
+        hits (list): (label, chunk_size, overlap, [(chunk id, score, text), ...])
+            per document; the label prefixes its lines in brackets if not None.
+        budget (int): Tokens available for the context.
+
+    Returns:
+        (str, list): The context and the labels of the documents it uses, best first.
+    """
+    with span("context"):
+        spans = [(score, label, text)
+                 for label, chunk_size, overlap, document_hits in hits
+                 for score, _, text in stitch(document_hits, chunk_size, overlap)]
+        picked = pack(spans, budget)
+        context = "".join(
+            f"{i+1}. " + (f"[{label}] " if label is not None else "") + text + "\n"
+            for i, (_, label, text) in enumerate(picked)
+        )
+
+    # prompt tokens saved against passing every retrieved chunk as is
+    retrieved = sum(estimate_tokens(text) for *_, document_hits in hits for _, _, text in document_hits)
+    packed = sum(estimate_tokens(text) for *_, text in picked)
+    count("context.tokens_retrieved", retrieved)
+    count("context.tokens_packed", packed)
+    count("context.tokens_saved", retrieved - packed)
+    return context, list(dict.fromkeys(label for _, label, _ in picked))
+
+def context_size(prompt, response_tokens=RESPONSE_TOKENS, max_ctx=MAX_CTX):
+    """
+    The context window (num_ctx) to request for a prompt.
+
+    Ollama reloads the model whenever num_ctx changes, so the size is rounded
+    up to a power of two (at least MIN_CTX) to keep the number of distinct
+    windows small.
+
+    Args:
+        prompt (str): The prompt.
+        response_tokens (int): Tokens reserved for the response.
+        max_ctx (int): Upper bound.
+
+    Returns:
+        int: The window size.
+    """
+    needed = estimate_tokens(prompt) + response_tokens
+    size = MIN_CTX
+    while size < needed:
+        size *= 2
+    return min(size, max_ctx)
@@ -0,0 +1,155 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from lib.config import SOCKET_PATH
+
+# Protocol: the client sends one JSON request per connection, terminated by a
+# newline. The daemon answers with JSON lines: {"token": ...} while an answer
+# is streamed, then a final {"result": ...} or {"error": ...}.
+
+def socket_path():
+    return os.path.abspath(SOCKET_PATH)
+
+def request(payload, on_token=None):
+    """
+    Forwards a command to a running `xpl serve` daemon.
+
+    Args:
+        payload (dict): The request, with a "command" key.
+        on_token (callable): Called with every streamed piece of an answer.
+
+    Returns:
+        (bool, object): (False, None) if no daemon is available or --profile
+        is on (the caller should run the command itself), else (True, result).
+    """
+    import lib.profile
+    if lib.profile.enabled():
+        return False, None  # profile in this process, where the spans are recorded
+
+    payload = dict(payload, cwd=os.getcwd())
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path())
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False, None
+
+    with conn, conn.makefile("rwb") as stream:
+        stream.write(json.dumps(payload).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "token" in message:
+                if on_token is not None:
+                    on_token(message["token"])
+            elif message.get("fallback"):
+                return False, None
+            elif "error" in message:
+                raise RuntimeError(f"xpl daemon: {message['error']}")
+            else:
+                return True, message.get("result")
+    return False, None
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        payload = json.loads(self.rfile.readline())
+        # relative store paths (chroma_path, bm25_path, ...) resolve against the cwd
+        if payload.get("cwd") != os.getcwd():
+            self.send({"fallback": True})
+            return
+        try:
+            handler = getattr(self, "do_" + payload["command"])
+            self.send({"result": handler(payload)})
+        except Exception as e:
+            traceback.print_exc()
+            self.send({"error": repr(e)})
+
+    def do_ask(self, payload):
+        import lib.processor
+        from lib.query import answer_question
+
+        filepath = payload["filepath"]
+        on_token = (lambda piece: piece and self.send({"token": piece})) if payload.get("stream") else None
+        if os.path.isdir(filepath):
+            from lib.query import answer_folder
+            pending = lib.processor.unprocessed_documents(filepath)
+            if pending:
+                lib.processor.process_documents(pending)
+            return answer_folder(filepath, payload["question"], on_token=on_token)
+
+        if not lib.processor.is_complete(filepath):
+            lib.processor.process_document(filepath)
+        return answer_question(filepath, payload["question"], on_token=on_token)
+
+    def do_process(self, payload):
+        import lib.processor
+
+        if payload.get("update"):
+            return lib.processor.update_document(payload["filename"])
+        return lib.processor.process_document(payload["filename"])
+
+    def do_delete(self, payload):
+        from lib.db import delete_collection
+        from lib.bm25 import delete_bm25_collection
+        import lib.parents
+        import lib.checkpoint
+        from lib.cache import get_answer_cache
+
+        # first, an interrupted document has no BM25 index to delete yet
+        lib.checkpoint.remove(payload["filename"])
+        delete_collection(payload["filename"])
+        delete_bm25_collection(payload["filename"])
+        lib.parents.delete(payload["filename"])
+        get_answer_cache().invalidate(payload["filename"])
+
+    def do_ping(self, payload):
+        return os.getpid()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve():
+    """
+    Runs the daemon in the foreground until interrupted.
+
+    Importing the pipeline once keeps chromadb, numpy, markitdown and the
+    NLTK models loaded; Chroma clients are kept per database by lib.db and
+    BM25 indexes by the LRU in lib.bm25.
+    """
+    import lib.processor
+    import lib.query
+    from lib.analyzer import get_analyzer
+    from lib.config import BM25_ANALYZER
+
+    get_analyzer(BM25_ANALYZER).analyze("Warm up the tokenizer, tagger and lemmatizer.")
+
+    path = socket_path()
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+                raise RuntimeError(f"A daemon is already listening on {path}.")
+            except ConnectionRefusedError:
+                os.remove(path)
+
+    # exit through the finally below (removing the socket) on `kill` as well
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with Server(path, Handler) as server:
+        print(f"xpl daemon listening on {path} (pid {os.getpid()})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
@@ -0,0 +1,63 @@
+import os
+from lib.config import VECTOR_STORE
+
+# The vector store backend is chosen by [vector_store] backend: "chroma"
+# (lib/db/chroma.py) or "flat" (lib/db/flat.py, memory-mapped vectors searched
+# exactly). Both expose the same functions, and their collections the subset
+# of Chroma's Collection API used by xpl.
+if VECTOR_STORE == "flat":
+    from lib.db.flat import (
+        get_client, database_exists, get_collection, collection_exists, forget_collection,
+        get_or_create_collection, list_collections, delete_collection, list_dbs,
+    )
+elif VECTOR_STORE == "chroma":
+    from lib.db.chroma import (
+        initialize_chroma_client as get_client, database_exists, get_collection, collection_exists,
+        forget_collection, get_or_create_collection, list_collections, delete_collection, list_dbs,
+    )
+else:
+    raise ValueError(f"Unknown vector store backend {VECTOR_STORE!r}, expected 'chroma' or 'flat'.")
+
+def update_metadata(collection, **values):
+    """
+    Merges values into a collection's metadata.
+
+    Args:
+        collection (Collection): The collection object.
+        **values: Metadata keys to set.
+    """
+    # the hnsw:* keys cannot be modified after creation
+    metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    metadata.update(values)
+    collection.modify(metadata=metadata)
+
+def db_exists_for_file(filename):
+    """
+    Checks if db exists given a specific file...
+    Args:
+        finename (str): The file to be processed
+    Returns:
+        exists (bool): True if the corresponding db exists...
+    """
+    return database_exists(os.path.dirname(os.path.abspath(filename)))
+
+def db_exists(folderpath):
+    """
+    Checks if db exists for a folder
+    Args:
+        folderpath (str): The folder path
+    Returns:
+        exists (bool): True if the corresponding db exists...
+    """
+    return database_exists(os.path.abspath(folderpath))
+
+def is_processed(filename):
+    """
+    Checks if file has been processed or not
+
+    Args:
+        finename (str): The file to be processed
+    Returns:
+        exists (bool): True if it exists
+    """
+    return collection_exists(os.path.dirname(os.path.abspath(filename)), os.path.basename(filename))
@@ -0,0 +1,203 @@
+from chromadb import PersistentClient, AdminClient
+from chromadb.config import Settings
+import chromadb
+from lib.config import CHROMA_PATH
+import threading
+import time
+import os
+
+# Registry of the Chroma objects of this process: the settings and admin
+# client are built once, clients are kept per database (the folder path) and
+# collections per (database, name). Existence checks are direct lookups that
+# hit the registry first, instead of listing databases or collections.
+_settings = None
+_admin_client = None
+_clients = dict()
+_collections = dict()
+_databases = set()
+_registry_lock = threading.RLock()
+
+def get_settings():
+    global _settings
+    with _registry_lock:
+        if _settings is None:
+            _settings = Settings(is_persistent=True, persist_directory=CHROMA_PATH)
+        return _settings
+
+def get_admin_client():
+    """
+    Returns the admin client, creating the xpl tenant the first time.
+
+    Returns:
+        AdminClient: The process-wide admin client.
+    """
+    global _admin_client
+    with _registry_lock:
+        if _admin_client is None:
+            admin_client = AdminClient(settings=get_settings())
+            try:
+                admin_client.get_tenant('xpl')
+            except chromadb.errors.NotFoundError:
+                admin_client.create_tenant('xpl')
+            _admin_client = admin_client
+        return _admin_client
+
+def initialize_chroma_client(db):
+    """
+    Initializes the ChromaDB client of a database, creating the database if
+    it does not exist.
+
+    Clients are kept per database, so a long-lived process (`xpl serve`)
+    only builds them once.
+
+    Returns:
+        Client: The initialized ChromaDB client.
+    """
+    with _registry_lock:
+        if db not in _clients:
+            if not database_exists(db):
+                get_admin_client().create_database(db, tenant='xpl')
+                _databases.add(db)
+            _clients[db] = PersistentClient(path=CHROMA_PATH, database=db, tenant='xpl', settings=get_settings())
+        return _clients[db]
+
+def database_exists(db):
+    """
+    Args:
+        db (str): The database name (absolute folder path).
+
+    Returns:
+        bool: True if the database exists.
+    """
+    with _registry_lock:
+        if db in _databases:
+            return True
+        try:
+            get_admin_client().get_database(db, tenant='xpl')
+        except chromadb.errors.NotFoundError:
+            return False
+        _databases.add(db)
+        return True
+
+def get_collection(db, collection_name):
+    """
+    Returns a collection through the registry.
+
+    Args:
+        db (str): The database name (absolute folder path).
+        collection_name (str): The name of the collection.
+
+    Returns:
+        Collection: The collection, or None if it does not exist.
+    """
+    key = (db, collection_name)
+    with _registry_lock:
+        if key in _collections:
+            return _collections[key]
+        if not database_exists(db):
+            return None
+        try:
+            collection = initialize_chroma_client(db).get_collection(collection_name)
+        except (chromadb.errors.InvalidCollectionException, ValueError):
+            return None
+        _collections[key] = collection
+        return collection
+
+def collection_exists(db, collection_name):
+    """
+    Args:
+        db (str): The database name (absolute folder path).
+        collection_name (str): The name of the collection.
+
+    Returns:
+        bool: True if the collection exists.
+    """
+    return get_collection(db, collection_name) is not None
+
+def forget_collection(db, collection_name):
+    """Drops a collection from the registry (after it was deleted)."""
+    with _registry_lock:
+        _collections.pop((db, collection_name), None)
+
+def get_or_create_collection(client, collection_name):
+    """
+    Retrieves or creates a collection within a database.
+
+    Args:
+        client (Client): The ChromaDB client object.
+        collection_name (str): The name of the collection.
+        embedding_function (callable): The function to generate embeddings.
+
+    Returns:
+        Collection: The ChromaDB collection object.
+    """
+    collection = get_collection(client.database, collection_name)
+    existed = collection is not None
+    if not existed:
+        # summary here...
+        collection = client.create_collection(
+            name=collection_name,
+            metadata = {
+                "created": str(time.time()),
+                "hnsw:space": "cosine",
+                "hnsw:construction_ef": 100,
+                "hnsw:search_ef": 100,
+                "hnsw:M": 16,                
+            }
+        )
+        with _registry_lock:
+            _collections[(client.database, collection_name)] = collection
+
+    return collection, existed
+
+def list_collections(folderpath):
+    return initialize_chroma_client(os.path.abspath(folderpath)).list_collections()
+
+# ERROR FIX COMMENTED OUT 
+# def delete_database(database_name):
+#     """
+#     Deletes a database under the 'xpl' tenant.
+
+#     Args:
+#         database_name (str): The name of the database to delete.
+#     """
+#     client = PersistentClient(path=DB_DIR)
+#     tenant = client.get_or_create_tenant("xpl")
+
+#     try:
+#         tenant.delete_database(database_name)
+#         print(f"Database '{database_name}' deleted successfully.")
+#     except Exception as e:
+#         print(f"Error deleting database '{database_name}': {e}")
+
+def delete_collection(filename):
+    """
+    Deletes a collection from a specified database.
+
+    Args:
+        database_name (str): The name of the database.
+        collection_name (str): The name of the collection to delete.
+    """
+    db = os.path.dirname(os.path.abspath(filename))
+    collection_name = os.path.basename(filename)
+    client = initialize_chroma_client(db)
+    forget_collection(db, collection_name)
+
+    try:
+        client.delete_collection(collection_name)
+        print(f"Collection '{collection_name}' deleted successfully from database '{db}'.")
+    except Exception as e:
+        print(f"Error deleting collection '{collection_name}': {e}")
+        raise e
+
+def list_dbs():
+    """
+    Lists dbs existing in defined tenant!
+    Returns:
+        list_dbs (Sequence[Database])
+    """
+    return get_admin_client().list_databases(tenant='xpl')
+
+if __name__ == "__main__":
+
+    client = initialize_chroma_client()
@@ -0,0 +1,450 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from lib.config import VECTOR_STORE_PATH, VECTOR_STORE_DTYPE
+
+# Flat vector store: every collection is a directory of append-only files,
+#
+#   meta.json      name, metadata, dimension and dtype
+#   vectors.bin    L2 normalized embeddings, float16 or int8 rows
+#   scales.bin     float32 scale of every int8 row (int8 only)
+#   ids.txt        one id per line
+#   documents.bin  utf-8 documents back to back, ends.bin their int64 end offsets
+#
+# under VECTOR_STORE_PATH/<sha256 of the folder>/<sha256 of the file name>.
+# Vectors are memory-mapped, decoded to float32 once per load and searched
+# exactly with one matmul. Collections implement the subset of Chroma's
+# Collection API that xpl uses (cosine space).
+
+DTYPES = {"float16": np.float16, "int8": np.int8}
+
+def _digest(name):
+    return hashlib.sha256(name.encode()).hexdigest()
+
+def db_path(db):
+    return os.path.join(VECTOR_STORE_PATH, _digest(db))
+
+def _write_json(path, value):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+class FlatCollection:
+    """
+    A collection of the flat store.
+
+    Args:
+        path (str): The collection directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._read_meta()
+        self._vectors = None
+        self._scales = None
+        self._ids = None
+        self._rows = None
+        self._ends = None
+        self._matrix = None
+
+    @staticmethod
+    def create(path, name, metadata=None, dtype=VECTOR_STORE_DTYPE):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector dtype {dtype!r}, expected one of {sorted(DTYPES)}.")
+        os.makedirs(path)
+        for file in ("vectors.bin", "scales.bin", "ids.txt", "documents.bin", "ends.bin"):
+            open(os.path.join(path, file), "wb").close()
+        _write_json(os.path.join(path, "meta.json"),
+                    {"name": name, "metadata": metadata or {}, "dimension": None, "dtype": dtype})
+        return FlatCollection(path)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        meta = _read_json(self._file("meta.json"))
+        self.name = meta["name"]
+        self._metadata = meta["metadata"]
+        self.dimension = meta.get("dimension")
+        self.dtype = meta["dtype"]
+
+    @property
+    def metadata(self):
+        with self._lock:
+            self._load()
+            return self._metadata
+
+    def _save_meta(self):
+        _write_json(self._file("meta.json"), {"name": self.name, "metadata": self._metadata,
+                                              "dimension": self.dimension, "dtype": self.dtype})
+
+    def _file_stamp(self):
+        """Changes whenever records are added or the collection is rewritten, by any handle or process."""
+        return tuple((st.st_mtime_ns, st.st_size, st.st_ino)
+                     for st in (os.stat(self._file("ids.txt")), os.stat(self._file("meta.json"))))
+
+    def _load(self):
+        """Maps the files on first use (and after they changed)."""
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._read_meta()
+            self._invalidate()
+            self._stamp = stamp
+        if self._ids is not None:
+            return
+        with open(self._file("ids.txt"), encoding="utf-8") as f:
+            self._ids = f.read().splitlines()
+        self._rows = {id: row for row, id in enumerate(self._ids)}
+        n = len(self._ids)
+        dtype = DTYPES[self.dtype]
+        self._vectors = (np.memmap(self._file("vectors.bin"), dtype=dtype, mode="r", shape=(n, self.dimension))
+                         if n else np.zeros((0, self.dimension or 0), dtype=dtype))
+        self._scales = (np.fromfile(self._file("scales.bin"), dtype=np.float32)
+                        if self.dtype == "int8" else None)
+        self._ends = np.fromfile(self._file("ends.bin"), dtype=np.int64)
+
+    def _invalidate(self):
+        self._vectors = self._scales = self._ids = self._rows = self._ends = self._matrix = None
+
+    def count(self):
+        with self._lock:
+            self._load()
+            return len(self._ids)
+
+    def modify(self, name=None, metadata=None):
+        with self._lock:
+            self._load()
+            if metadata is not None:
+                self._metadata = dict(metadata)
+            self._save_meta()
+
+    def _encode(self, embeddings):
+        """Normalizes (and quantizes) embeddings: (rows, scales)."""
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            safe = np.where(scales == 0, 1, scales)[:, None]
+            return np.round(vectors / safe).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(np.float16), None
+
+    def _decode(self, rows):
+        vectors = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows, None]
+        return vectors
+
+    def add(self, ids, embeddings, documents):
+        """Appends records; ids must not exist yet."""
+        with self._lock:
+            self._load()
+            if any(id in self._rows for id in ids):
+                raise ValueError(f"Ids already exist in collection {self.name}.")
+            if len(ids) != len(embeddings) or len(ids) != len(documents):
+                raise ValueError("ids, embeddings and documents must have the same length.")
+            if not len(ids):
+                return
+            rows, scales = self._encode(embeddings)
+            if self.dimension is None:
+                self.dimension = rows.shape[1]
+                self._save_meta()
+            elif rows.shape[1] != self.dimension:
+                raise ValueError(f"Expected embeddings of dimension {self.dimension}, got {rows.shape[1]}.")
+
+            encoded = [document.encode("utf-8") for document in documents]
+            start = int(self._ends[-1]) if len(self._ends) else 0
+            ends = start + np.cumsum([len(e) for e in encoded], dtype=np.int64)
+            # documents and vectors first, the ids make the records visible
+            with open(self._file("documents.bin"), "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self._file("ends.bin"), "ab") as f:
+                f.write(ends.tobytes())
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.write(rows.tobytes())
+            if scales is not None:
+                with open(self._file("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            with open(self._file("ids.txt"), "a", encoding="utf-8") as f:
+                f.write("".join(f"{id}\n" for id in ids))
+            self._invalidate()
+
+    def _records(self):
+        """All records as (ids, float32 vectors, documents), read afresh."""
+        self._stamp = None
+        self._load()
+        rows = np.arange(len(self._ids))
+        return list(self._ids), self._decode(rows), self._documents(rows)
+
+    def _rewrite(self, ids, vectors, documents):
+        """Replaces the content of the collection (used by upsert and delete)."""
+        tmp = self.path + ".rewrite"
+        shutil.rmtree(tmp, ignore_errors=True)
+        rewritten = FlatCollection.create(tmp, self.name, self._metadata, self.dtype)
+        rewritten.add(ids, vectors, documents)
+        for file in ("vectors.bin", "scales.bin", "ids.txt", "documents.bin", "ends.bin", "meta.json"):
+            os.replace(os.path.join(tmp, file), self._file(file))
+        shutil.rmtree(tmp, ignore_errors=True)
+        self.dimension = rewritten.dimension if rewritten.dimension is not None else self.dimension
+        self._save_meta()
+        self._invalidate()
+
+    def upsert(self, ids, embeddings, documents):
+        with self._lock:
+            self._load()
+            if not any(id in self._rows for id in ids):
+                return self.add(ids, embeddings, documents)
+            current_ids, vectors, current_documents = self._records()
+            records = {id: (v, d) for id, v, d in zip(current_ids, vectors, current_documents)}
+            records.update((id, (np.asarray(e, dtype=np.float32), d)) for id, e, d in zip(ids, embeddings, documents))
+            self._rewrite(list(records), [v for v, _ in records.values()], [d for _, d in records.values()])
+
+    def delete(self, ids):
+        with self._lock:
+            removed = set(ids)
+            current_ids, vectors, documents = self._records()
+            keep = [i for i, id in enumerate(current_ids) if id not in removed]
+            self._rewrite([current_ids[i] for i in keep], vectors[keep], [documents[i] for i in keep])
+
+    def _documents(self, rows):
+        if not len(rows):
+            return []
+        blob = np.memmap(self._file("documents.bin"), dtype=np.uint8, mode="r") if self._ends[-1] else b""
+        starts = np.concatenate(([0], self._ends[:-1]))
+        return [bytes(blob[starts[r]:self._ends[r]]).decode("utf-8") for r in rows]
+
+    def get(self, ids=None, include=("documents",)):
+        """
+        Args:
+            ids (list): Ids to fetch (all records if None); unknown ids are skipped.
+            include (list): Any of "documents", "embeddings".
+
+        Returns:
+            dict: "ids" and the included fields, in the order of `ids`.
+        """
+        with self._lock:
+            self._load()
+            rows = (np.arange(len(self._ids)) if ids is None
+                    else np.array([self._rows[id] for id in ids if id in self._rows], dtype=np.int64))
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = self._documents(rows)
+            if "embeddings" in include:
+                result["embeddings"] = self._decode(rows)
+            return result
+
+    def query(self, query_embeddings, n_results=10, include=("distances",)):
+        """
+        Exact top-k by cosine distance.
+
+        Args:
+            query_embeddings (list): Query vectors.
+            n_results (int): Number of results per query.
+            include (list): Any of "distances", "documents".
+
+        Returns:
+            dict: Per query lists of "ids" and the included fields, nearest first.
+        """
+        with self._lock:
+            self._load()
+            queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+            queries /= np.where((norms := np.linalg.norm(queries, axis=1, keepdims=True)) == 0, 1, norms)
+            n = len(self._ids)
+            if not n:
+                empty = {"ids": [[] for _ in queries], "distances": [[] for _ in queries],
+                         "documents": [[] for _ in queries]}
+                return {key: value for key, value in empty.items() if key == "ids" or key in include}
+            if self._matrix is None:
+                self._matrix = self._decode(slice(None))
+            scores = queries @ self._matrix.T
+
+            result = {"ids": [], "distances": [], "documents": []}
+            k = min(n_results, n)
+            for row_scores in scores:
+                best = np.argpartition(-row_scores, k - 1)[:k] if 0 < k < n else np.arange(n)
+                best = best[np.argsort(-row_scores[best], kind="stable")]
+                result["ids"].append([self._ids[r] for r in best])
+                result["distances"].append((1 - row_scores[best]).tolist())
+                if "documents" in include:
+                    result["documents"].append(self._documents(best))
+            return {key: value for key, value in result.items() if key == "ids" or key in include}
+
+
+class FlatClient:
+    """The collections of one database (folder) of the flat store."""
+
+    def __init__(self, db):
+        self.database = db
+        self.path = db_path(db)
+
+    def collection_path(self, name):
+        return os.path.join(self.path, _digest(name))
+
+    def get_collection(self, name):
+        path = self.collection_path(name)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise ValueError(f"Collection {name} does not exist.")
+        return FlatCollection(path)
+
+    def create_collection(self, name, metadata=None):
+        return FlatCollection.create(self.collection_path(name), name, metadata)
+
+    def list_collections(self):
+        if not os.path.isdir(self.path):
+            return []
+        names = []
+        for entry in os.scandir(self.path):
+            meta = os.path.join(entry.path, "meta.json")
+            if entry.is_dir() and os.path.exists(meta):
+                names.append(_read_json(meta)["name"])
+        return names
+
+    def delete_collection(self, name):
+        path = self.collection_path(name)
+        if not os.path.isdir(path):
+            raise ValueError(f"Collection {name} does not exist.")
+        shutil.rmtree(path)
+
+
+# Same registry as the Chroma backend: clients per database, collections per
+# (database, name).
+_clients = dict()
+_collections = dict()
+_registry_lock = threading.RLock()
+
+def get_client(db):
+    """
+    Returns the client of a database, creating the database if it does not exist.
+
+    Returns:
+        FlatClient: The client.
+    """
+    with _registry_lock:
+        if db not in _clients:
+            path = db_path(db)
+            if not os.path.exists(os.path.join(path, "db.json")):
+                os.makedirs(path, exist_ok=True)
+                _write_json(os.path.join(path, "db.json"), {"name": db, "created": str(time.time())})
+            _clients[db] = FlatClient(db)
+        return _clients[db]
+
+def database_exists(db):
+    return os.path.exists(os.path.join(db_path(db), "db.json"))
+
+def get_collection(db, collection_name):
+    """
+    Returns a collection through the registry.
+
+    Returns:
+        FlatCollection: The collection, or None if it does not exist.
+    """
+    key = (db, collection_name)
+    with _registry_lock:
+        if key in _collections:
+            return _collections[key]
+        if not database_exists(db):
+            return None
+        try:
+            collection = get_client(db).get_collection(collection_name)
+        except ValueError:
+            return None
+        _collections[key] = collection
+        return collection
+
+def collection_exists(db, collection_name):
+    return get_collection(db, collection_name) is not None
+
+def forget_collection(db, collection_name):
+    with _registry_lock:
+        _collections.pop((db, collection_name), None)
+
+def get_or_create_collection(client, collection_name):
+    """
+    Retrieves or creates a collection within a database.
+
+    Returns:
+        (FlatCollection, bool): The collection and whether it existed.
+    """
+    collection = get_collection(client.database, collection_name)
+    if collection is not None:
+        return collection, True
+    collection = client.create_collection(collection_name, metadata={"created": str(time.time())})
+    with _registry_lock:
+        _collections[(client.database, collection_name)] = collection
+    return collection, False
+
+def list_collections(folderpath):
+    return get_client(os.path.abspath(folderpath)).list_collections()
+
+def delete_collection(filename):
+    db = os.path.dirname(os.path.abspath(filename))
+    collection_name = os.path.basename(filename)
+    forget_collection(db, collection_name)
+    try:
+        get_client(db).delete_collection(collection_name)
+        print(f"Collection '{collection_name}' deleted successfully from database '{db}'.")
+    except Exception as e:
+        print(f"Error deleting collection '{collection_name}': {e}")
+        raise e
+
+def list_dbs():
+    """
+    Returns:
+        list: dicts with the id, name and tenant of every database.
+    """
+    if not os.path.isdir(VECTOR_STORE_PATH):
+        return []
+    dbs = []
+    for entry in os.scandir(VECTOR_STORE_PATH):
+        if os.path.exists(os.path.join(entry.path, "db.json")):
+            dbs.append({"id": entry.name, "name": _read_json(os.path.join(entry.path, "db.json"))["name"], "tenant": "xpl"})
+    return sorted(dbs, key=lambda db: db["name"])
+
+def migrate_from_chroma(page_size=1000, overwrite=False):
+    """
+    Copies every Chroma collection (documents, embeddings and metadata) into
+    the flat store.
+
+    Args:
+        page_size (int): Records read from Chroma at a time.
+        overwrite (bool): Replace collections that already exist in the flat store.
+
+    Returns:
+        dict: Counts of copied and skipped collections and of copied records.
+    """
+    import lib.db.chroma as chroma
+
+    stats = {"copied": 0, "skipped": 0, "records": 0}
+    for database in chroma.list_dbs():
+        db = database["name"]
+        for name in chroma.list_collections(db):
+            if collection_exists(db, name):
+                if not overwrite:
+                    stats["skipped"] += 1
+                    print(f"Skipping {os.path.join(db, name)}: already in the flat store.")
+                    continue
+                delete_collection(os.path.join(db, name))
+
+            source = chroma.get_collection(db, name)
+            metadata = {k: v for k, v in (source.metadata or {}).items() if not k.startswith("hnsw:")}
+            target, _ = get_or_create_collection(get_client(db), name)
+            target.modify(metadata=metadata)
+            total = source.count()
+            for offset in range(0, total, page_size):
+                page = source.get(include=["documents", "embeddings"], limit=page_size, offset=offset)
+                target.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"])
+            stats["copied"] += 1
+            stats["records"] += total
+            print(f"Copied {os.path.join(db, name)}: {total} chunks.")
+    return stats
@@ -0,0 +1,163 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from lib.config import (EMBEDDING_API_URL, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY,
+                        EMBEDDING_MAX_RETRIES, EMBEDDING_RETRY_BACKOFF, CACHE_EMBEDDINGS)
+from lib.cache import get_embedding_cache
+from lib.profile import span, count
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+def get_session():
+    """
+    Returns the shared HTTP session used for all embedding requests.
+
+    The session keeps its connections alive, so consecutive batches reuse the
+    same sockets instead of paying a new TCP handshake each time.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, EMBEDDING_CONCURRENCY))
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+def get_executor():
+    """
+    Returns the shared thread pool that bounds the number of embedding requests in flight.
+
+    Returns:
+        ThreadPoolExecutor: The shared executor.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, EMBEDDING_CONCURRENCY), thread_name_prefix="xpl-embed")
+    return _executor
+
+def is_transient(error):
+    """
+    Tells whether a failed request is worth retrying.
+
+    Args:
+        error (Exception): The error raised by the request.
+
+    Returns:
+        bool: True for connection errors, timeouts, 429 and 5xx responses.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+def embed_batch(texts):
+    """
+    Embeds a batch of texts with a single call to the Ollama `/api/embed` endpoint.
+
+    Args:
+        texts (list): List of text strings.
+
+    Returns:
+        list: List of embeddings, in the same order as `texts`.
+    """
+    with span("embed.request", texts=len(texts)):
+        response = get_session().post(
+            EMBEDDING_API_URL,
+            json={"model": EMBEDDING_MODEL, "input": texts}
+        )
+    count("http.requests")
+    count("http.bytes_sent", len(response.request.body or b""))
+    count("http.bytes_received", len(response.content))
+    response.raise_for_status()
+    embeddings = response.json().get("embeddings", [])
+    if len(embeddings) != len(texts):
+        raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}.")
+    return embeddings
+
+def embed_batch_with_retry(texts, max_retries=EMBEDDING_MAX_RETRIES, backoff=EMBEDDING_RETRY_BACKOFF):
+    """
+    Embeds a batch, retrying transient failures with exponential backoff.
+
+    Args:
+        texts (list): List of text strings.
+        max_retries (int): Number of retries after the first attempt.
+        backoff (float): Initial wait in seconds, doubled after every failure.
+
+    Returns:
+        list: List of embeddings, in the same order as `texts`.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embed_batch(texts)
+        except requests.RequestException as e:
+            if attempt == max_retries or not is_transient(e):
+                raise e
+            wait = backoff * (2 ** attempt)
+            print(f"Embedding request failed ({e}), retrying in {wait:.1f}s...")
+            time.sleep(wait)
+
+def embed(texts, batch_size=EMBEDDING_BATCH_SIZE, use_cache=CACHE_EMBEDDINGS):
+    """
+    Embeds a list of texts, sending `batch_size` texts per request.
+
+    Texts already in the embedding cache are not sent; repeated texts are
+    sent once. The remaining batches are dispatched on the shared executor,
+    so up to `EMBEDDING_CONCURRENCY` requests are in flight at once; results
+    are reassembled in input order.
+
+    Args:
+        texts (list): List of text strings.
+        batch_size (int): Number of texts per request.
+        use_cache (bool): Check and fill the embedding cache.
+
+    Returns:
+        list: List of embeddings, in the same order as `texts`.
+    """
+    embeddings = get_embedding_cache().get_many(EMBEDDING_MODEL, texts) if use_cache else [None] * len(texts)
+
+    missing = dict()
+    for i, text in enumerate(texts):
+        if embeddings[i] is None:
+            missing.setdefault(text, []).append(i)
+    if use_cache:
+        count("embedding.cache_hits", len(texts) - sum(map(len, missing.values())))
+        count("embedding.cache_misses", sum(map(len, missing.values())))
+    if not missing:
+        return embeddings
+
+    pending = list(missing)
+    count("embedding.texts_embedded", len(pending))
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    if len(batches) == 1:
+        computed = embed_batch_with_retry(batches[0])
+    else:
+        computed = [e for result in get_executor().map(embed_batch_with_retry, batches) for e in result]
+
+    if use_cache:
+        get_embedding_cache().put_many(EMBEDDING_MODEL, pending, computed)
+    for text, embedding in zip(pending, computed):
+        for i in missing[text]:
+            embeddings[i] = embedding
+    return embeddings
+
+def embed_one(text):
+    """
+    Embeds a single text.
+
+    Args:
+        text (str): The text to embed.
+
+    Returns:
+        list: The embedding vector.
+    """
+    return embed([text])[0]
@@ -0,0 +1,106 @@
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from lib.config import LLM_API_URL, LLM_MODEL, LLM_CONCURRENCY
+from lib.profile import span, count
+
+_session = None
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, LLM_CONCURRENCY))
+
+def get_session():
+    """
+    Returns the shared HTTP session used for all LLM requests.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, LLM_CONCURRENCY))
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+def _payload(prompt, stream, num_ctx):
+    return {"model": LLM_MODEL, "prompt": prompt, "stream": stream,
+        "format": "json",
+        "options": {
+            "temperature": 0,
+            "num_ctx": num_ctx
+        }}
+
+def generate(prompt, default="No response generated.", num_ctx=10000):
+    """
+    Runs a (non streamed, json formatted, temperature 0) generation on the local Ollama API.
+
+    At most `LLM_CONCURRENCY` generations run at once across all threads, so
+    documents processed side by side share the same request budget.
+
+    Args:
+        prompt (str): The prompt.
+        default (str): Returned if the model produced no response.
+        num_ctx (int): Context window of the model.
+
+    Returns:
+        str: The model response.
+    """
+    headers = {
+        "Content-Type": "application/json"
+    }
+    with _slots, span("llm.request", prompt_chars=len(prompt)):
+        response = get_session().post(
+            LLM_API_URL,
+            headers=headers,
+            json=_payload(prompt, False, num_ctx)
+        )
+    count("http.requests")
+    count("http.bytes_sent", len(response.request.body or b""))
+    count("http.bytes_received", len(response.content))
+    response.raise_for_status()
+
+    message = response.json()
+    count("llm.tokens_generated", message.get("eval_count", 0))
+    return message.get("response", default)
+
+def generate_stream(prompt, on_token, default="No response generated.", num_ctx=10000):
+    """
+    Runs a streamed generation, reading Ollama's NDJSON stream as it arrives.
+
+    Args:
+        prompt (str): The prompt.
+        on_token (callable): Called with every generated piece of text, as soon as it is received.
+        default (str): Returned if the model produced no response.
+        num_ctx (int): Context window of the model.
+
+    Returns:
+        str: The full model response.
+    """
+    headers = {
+        "Content-Type": "application/json"
+    }
+    pieces = []
+    with _slots, span("llm.stream", prompt_chars=len(prompt)):
+        with get_session().post(LLM_API_URL, headers=headers, json=_payload(prompt, True, num_ctx), stream=True) as response:
+            count("http.requests")
+            count("http.bytes_sent", len(response.request.body or b""))
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                count("http.bytes_received", len(line))
+                message = json.loads(line)
+                if message.get("error"):
+                    raise RuntimeError(message["error"])
+                token = message.get("response", "")
+                if token:
+                    pieces.append(token)
+                    on_token(token)
+                if message.get("done"):
+                    count("llm.tokens_generated", message.get("eval_count", len(pieces)))
+                    break
+
+    return "".join(pieces) or default
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import numpy as np
+from lib.config import BM25_PATH, PARENT_SIZE
+from lib.context import stitch
+
+# Two-level index of a document: the chunks (lib.utils.iter_chunks) are what
+# the embeddings and BM25 match, the parents are larger spans that follow the
+# structure of the markdown (sections, paragraphs, sentences) and are what the
+# prompt gets. Parents are consecutive and cover the whole text, so a document
+# only stores the end offset of every parent (an int64 array next to its BM25
+# index). Chunk i starts at character i * (chunk_size - overlap), so the
+# parent of a chunk and the chunks of a parent are computed from the offsets,
+# and the text of a parent is stitched back from its chunks.
+
+# a parent is cut at the first heading after its minimum size, otherwise at
+# the last paragraph, sentence or word break that fits
+HEADING = re.compile(r"\n(?=#{1,6}\s)")
+PARAGRAPH = re.compile(r"\n[ \t]*\n")
+SENTENCE = re.compile(r"[.!?][\"')\]]*\s")
+WORD = re.compile(r"\s")
+
+def parents_path(file_path):
+    loc = hashlib.sha256(file_path.encode()).hexdigest()
+    return BM25_PATH+f"/{loc}.parents.npy"
+
+def _cut(buffer, start, max_size, min_size, final):
+    """The end of the parent starting at `start` in `buffer`, or None if more text is needed."""
+    heading = HEADING.search(buffer, start + min_size, start + max_size)
+    if heading:
+        return heading.end()
+    if len(buffer) - start <= max_size:
+        return len(buffer) if final else None
+    for pattern in (PARAGRAPH, SENTENCE, WORD):
+        last = None
+        for last in pattern.finditer(buffer, start + min_size, start + max_size):
+            pass
+        if last:
+            return last.end()
+    return start + max_size
+
+def iter_parent_bounds(text, max_size=PARENT_SIZE, min_size=None):
+    """
+    Lazily splits text into structure-aware parent spans.
+
+    Args:
+        text (str | iterable): The input text, or an iterable of consecutive text blocks.
+        max_size (int): The maximum size of a parent.
+        min_size (int): Headings closer than this to the start of a parent
+            do not end it (a quarter of `max_size` by default).
+
+    Yields:
+        int: The end offset of every parent, in order; the last one is the text length.
+    """
+    min_size = max_size // 4 if min_size is None else min_size
+    buffer, offset = "", 0
+    for block in ([text] if isinstance(text, str) else text):
+        buffer += block
+        start = 0
+        while (end := _cut(buffer, start, max_size, min_size, final=False)) is not None:
+            yield offset + end
+            start = end
+        buffer, offset = buffer[start:], offset + start
+
+    start = 0
+    while start < len(buffer):
+        start = _cut(buffer, start, max_size, min_size, final=True)
+        yield offset + start
+
+def parent_bounds(text, max_size=PARENT_SIZE):
+    """
+    Returns:
+        np.ndarray: The end offsets of the parents of `text` (see `iter_parent_bounds`).
+    """
+    return np.fromiter(iter_parent_bounds(text, max_size), dtype=np.int64)
+
+def save(bounds, file_path):
+    os.makedirs(BM25_PATH, exist_ok=True)
+    path = parents_path(file_path)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, np.asarray(bounds, dtype=np.int64))
+    os.replace(path + ".tmp", path)
+
+def load(file_path):
+    """
+    Returns:
+        np.ndarray: The parent end offsets of the document, or None if it has none.
+    """
+    try:
+        return np.load(parents_path(file_path))
+    except FileNotFoundError:
+        return None
+
+def delete(file_path):
+    if os.path.exists(parents_path(file_path)):
+        os.remove(parents_path(file_path))
+
+def parents_of(ids, bounds, chunk_size, overlap):
+    """
+    Args:
+        ids (np.ndarray): Chunk ids.
+        bounds (np.ndarray): The parent end offsets.
+        chunk_size (int): The chunk size the document was processed with.
+        overlap (int): The overlap it was processed with.
+
+    Returns:
+        np.ndarray: The parent holding the middle of every chunk.
+    """
+    middles = np.minimum(np.asarray(ids, dtype=np.int64) * (chunk_size - overlap) + chunk_size // 2, bounds[-1] - 1)
+    return np.minimum(np.searchsorted(bounds, middles, side="right"), len(bounds) - 1)
+
+def parent_span(parent, bounds):
+    """
+    Returns:
+        (int, int): The start and end offsets of the parent.
+    """
+    return (int(bounds[parent - 1]) if parent else 0), int(bounds[parent])
+
+def children_of(parent, bounds, chunk_size, overlap):
+    """
+    Returns:
+        range: The ids of the chunks covering the parent.
+    """
+    step = chunk_size - overlap
+    start, end = parent_span(parent, bounds)
+    return range(start // step, (end - 1) // step + 1)
+
+def expand(collection, ranked, bounds, chunk_size, overlap):
+    """
+    Replaces ranked chunks by their deduplicated parents.
+
+    The chunks of all the parents are fetched with one store query.
+
+    Args:
+        collection (Collection): The document's collection.
+        ranked (list): (chunk ids, scores) of every query, best first.
+        bounds (np.ndarray): The parent end offsets of the document.
+        chunk_size (int): The chunk size the document was processed with.
+        overlap (int): The overlap it was processed with.
+
+    Returns:
+        list: (parent id, score, text) of every query, best first, a parent
+        scoring as its best chunk.
+    """
+    step = chunk_size - overlap
+    ranked_parents = []
+    for ids, scores in ranked:
+        best = dict()
+        for parent, score in zip(parents_of(ids, bounds, chunk_size, overlap).tolist(), scores):
+            best.setdefault(parent, float(score))
+        ranked_parents.append(best)
+
+    wanted = sorted({parent for best in ranked_parents for parent in best})
+    children = sorted({i for parent in wanted for i in children_of(parent, bounds, chunk_size, overlap)})
+    results = collection.get(ids=[str(i) for i in children], include=["documents"])
+    documents = dict(zip(results["ids"], results["documents"]))
+
+    texts = dict()
+    for parent in wanted:
+        chunks = [(i, 0, documents[str(i)]) for i in children_of(parent, bounds, chunk_size, overlap) if str(i) in documents]
+        if not chunks:
+            continue
+        # consecutive chunks stitch into one span starting at the first one
+        _, ids, text = stitch(chunks, chunk_size, overlap)[0]
+        start, end = parent_span(parent, bounds)
+        texts[parent] = text[start - ids[0] * step:end - ids[0] * step]
+
+    return [[(parent, score, texts[parent]) for parent, score in best.items() if parent in texts]
+            for best in ranked_parents]
@@ -1,23 +1,42 @@
+import glob
+import importlib.metadata
+import itertools
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 import requests
-from markitdown import MarkItDown
-from lib.config import CHUNK_SIZE, OVERLAP, EMBEDDING_API_URL, EMBEDDING_MODEL
-from lib.db import initialize_chroma_client, get_or_create_collection
+from lib.config import (CHUNK_SIZE, OVERLAP, PARENT_SIZE, WORKERS, BM25_ANALYZER, INGEST_BATCH_SIZE, EMBEDDING_MODEL,
+                        S_STRATEGY, S_CHUNK_SIZE, S_OVERLAP, CACHE_EXTRACTIONS)
+from lib.db import get_client, get_or_create_collection, get_collection, update_metadata, is_processed, delete_collection
 from lib.summary import get_summary
 import lib.utils
-from lib.bm25 import BM25Retriever
+import lib.embedding
+import lib.parents
+from lib.bm25 import BM25Retriever, PostingsBuilder
+from lib.cache import get_answer_cache, get_extraction_cache
+import lib.checkpoint
+from lib.checkpoint import Checkpoint
+from lib.analyzer import get_analyzer
 import lib.exception as exception
+from lib.profile import span, count
+
+# the basic formats markitdown converts without extra dependencies
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".pptx", ".xlsx", ".html", ".htm", ".csv", ".json", ".xml", ".md", ".txt", ".epub")
+# formats markitdown passes through as is, so they can be read block by block
+PLAIN_TEXT_EXTENSIONS = (".md", ".txt")
+
+def markitdown_version():
+    # read from the package metadata, so a cache hit does not import markitdown
+    try:
+        return importlib.metadata.version("markitdown")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+def convert_markdown(filepath):
+    """Converts a document to markdown with markitdown."""
+    from markitdown import MarkItDown
 
-def extract_markdown(filepath):
-    """
-    Extracts text from a PDF file.
-    
-    Args:
-        filepath (str): Path to the PDF file.
-        
-    Returns:
-        str: Extracted text.
-    """
     try:
         md = MarkItDown()
         doc = md.convert(filepath)
@@ -26,9 +45,132 @@ def extract_markdown(filepath):
         raise e
     return doc.text_content
 
+def extract_markdown(filepath, use_cache=CACHE_EXTRACTIONS):
+    """
+    Extracts text from a document as markdown.
+
+    Conversions are cached by file content and markitdown version (see
+    `lib.cache.ExtractionCache`); plain text formats are not cached.
+    
+    Args:
+        filepath (str): Path to the document.
+        use_cache (bool): Check and fill the extraction cache.
+        
+    Returns:
+        str: Extracted text.
+    """
+    if not use_cache or filepath.lower().endswith(PLAIN_TEXT_EXTENSIONS):
+        return convert_markdown(filepath)
+
+    key = (lib.utils.file_hash(filepath), markitdown_version())
+    text = get_extraction_cache().get(*key)
+    if text is not None:
+        count("extraction.cache_hits")
+        return text
+    count("extraction.cache_misses")
+    text = convert_markdown(filepath)
+    if text:
+        get_extraction_cache().put(*key, text)
+    return text
+
+def worker_pool(workers):
+    """
+    A pool of `workers` processes, spawned rather than forked: `xpl serve`
+    processes folders from a threaded server, and a forked child could
+    inherit a lock held by another thread (a cache connection, the embedding
+    executor) and deadlock.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def warm_extraction(filepath):
+    """
+    Fills the extraction cache with a document (run in a worker process by `warm_extractions`).
+
+    Returns:
+        (bool, float): Whether it was already cached and the seconds it took.
+    """
+    start = time.perf_counter()
+    key = (lib.utils.file_hash(filepath), markitdown_version())
+    cached = get_extraction_cache().contains(*key)
+    if not cached:
+        text = convert_markdown(filepath)
+        if text:
+            get_extraction_cache().put(*key, text)
+    return cached, time.perf_counter() - start
+
+def warm_extractions(filepaths, workers=WORKERS):
+    """
+    Extracts documents into the extraction cache with a pool of `workers`
+    processes, so that processing them (again) skips the conversion.
+
+    Args:
+        filepaths (list): Paths of the documents.
+        workers (int): Number of worker processes.
+
+    Returns:
+        dict: Counts of extracted, already cached and failed documents.
+    """
+    stats = {"extracted": 0, "cached": 0, "failed": 0}
+    filepaths = [f for f in filepaths if not f.lower().endswith(PLAIN_TEXT_EXTENSIONS)]
+    start = time.perf_counter()
+    with worker_pool(workers) as pool:
+        futures = {pool.submit(warm_extraction, f): f for f in filepaths}
+        for n, future in enumerate(as_completed(futures), 1):
+            filepath = futures[future]
+            try:
+                cached, seconds = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"Failed {filepath}: {e!r}")
+                continue
+            stats["cached" if cached else "extracted"] += 1
+            print(f"[{n}/{len(filepaths)}] {filepath}: {'cached' if cached else 'extracted'} ({seconds:.1f}s)")
+    if filepaths:
+        print(f"Warmed {len(filepaths)} documents in {time.perf_counter() - start:.1f}s.")
+    return stats
+
+class TextBlocks:
+    """
+    A plain text file as a re-iterable of text blocks, read lazily.
+
+    Args:
+        filepath (str): Path to the file.
+        block_size (int): Characters per block.
+    """
+
+    def __init__(self, filepath, block_size=1 << 20):
+        self.filepath = filepath
+        self.block_size = block_size
+
+    def __iter__(self):
+        with open(self.filepath, encoding="utf-8", errors="replace") as f:
+            yield from iter(lambda: f.read(self.block_size), "")
+
+def read_markdown(filepath):
+    """
+    Reads a document as markdown, without holding it whole in memory when
+    possible: plain text formats are read block by block, other formats are
+    converted at once by markitdown.
+
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        iterable: Consecutive text blocks (can be iterated several times).
+    """
+    if filepath.lower().endswith(PLAIN_TEXT_EXTENSIONS):
+        return TextBlocks(filepath)
+    return [extract_markdown(filepath)]
+
 def generate_embeddings(text_chunks):
     """
     Generates embeddings for a list of text chunks using the local Ollama API.
+
+    Chunks are sent in batches of `EMBEDDING_BATCH_SIZE` over one keep-alive
+    session; the output keeps the order of `text_chunks`.
     
     Args:
         text_chunks (list): List of text strings.
@@ -36,75 +178,422 @@ def generate_embeddings(text_chunks):
     Returns:
         list: List of embeddings.
     """
-    embeddings = []
-    for chunk in text_chunks:
-        try:
-            response = requests.post(
-                EMBEDDING_API_URL,
-                json={"model": EMBEDDING_MODEL, "prompt": chunk}
-            )
-            response.raise_for_status()
-            embedding = response.json().get("embedding")
-            if embedding:
-                embeddings.append(embedding)
-        except requests.RequestException as e:
-            print(f"Error generating embedding: {e}")
-            raise e
-    return embeddings
-
-def process_document(filepath):
+    try:
+        return lib.embedding.embed(text_chunks)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error generating embedding: {e}")
+        raise e
+
+def is_supported(filepath):
+    return filepath.lower().endswith(SUPPORTED_EXTENSIONS)
+
+def prepare_document(filepath):
+    """
+    Extracts a document ahead of processing it: the CPU bound conversion.
+
+    When processing a folder this runs in a worker process. Only what
+    `process_document` cannot read by itself crosses back: plain text files
+    are read by it block by block, and other formats go through the
+    extraction cache, so the text is returned only when the cache is disabled.
+
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        str: The extracted text, or None if `process_document` reads it.
+    """
+    if filepath.lower().endswith(PLAIN_TEXT_EXTENSIONS):
+        return None
+    with span("extract"):
+        if CACHE_EXTRACTIONS:
+            warm_extraction(filepath)
+            return None
+        text = extract_markdown(filepath, use_cache=False)
+
+    if not text:
+        print(f"No text extracted from {filepath}.")
+        raise exception.ProcessingError
+    return text
+
+def process_document(filepath, prepared=None, pool=None):
     """
     Processes a document: extracts text, generates embeddings, and stores them in the vector database.
     
     Args:
         filepath (str): Path to the document.
+        prepared (str): Output of `prepare_document`, if it already ran elsewhere.
+        pool (ProcessPoolExecutor): Tokenizes the chunks if given (see `ingest`).
+
+    Returns:
+        int: Number of chunks stored.
     """
     if not os.path.isfile(filepath):
         print(f"File {filepath} does not exist.")
         raise exception.FileNotFoundError
 
-    # Extract text based on file type
-    if filepath.lower().endswith(".pdf"): #needs to include all allowed markitdown files
-        text = extract_markdown(filepath) 
-    else:
+    if not is_supported(filepath):
         print(f"Unsupported file format: {filepath}")
         raise exception.UnsupportedFileTypeError
-    
-    if not text:
+
+    # a collection without a checkpoint is complete, one with a checkpoint was interrupted
+    existing = get_collection(os.path.dirname(os.path.abspath(filepath)), os.path.basename(filepath))
+    checkpoint = Checkpoint.load(filepath, stored=existing.count() if existing is not None else 0)
+    if checkpoint is None and lib.checkpoint.exists(filepath):
+        print(f"{filepath} lost chunks since it was interrupted, processing it from scratch.")
+        if existing is not None:
+            delete_collection(filepath)
+    elif checkpoint is None and existing is not None:
+        raise exception.AlreadyProcessed
+
+    metadata = file_metadata(filepath)
+    settings = checkpoint_settings(metadata)
+    if checkpoint is not None and not checkpoint.matches(settings):
+        print(f"{filepath} changed since it was interrupted, processing it from scratch.")
+        if is_processed(filepath):
+            delete_collection(filepath)
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = Checkpoint.start(filepath, settings)
+    else:
+        print(f"Resuming {filepath} after {checkpoint.chunks} chunks.")
+
+    with span("extract"):
+        text = read_markdown(filepath) if prepared is None else [prepared]
+    if not next(iter(text), ""):
+        checkpoint.remove()
         print(f"No text extracted from {filepath}.")
         raise exception.ProcessingError
+    text_chunks = lib.utils.iter_chunks(text, CHUNK_SIZE, OVERLAP)
     
     # Spin up a client and find collection
-    client = initialize_chroma_client(os.path.dirname(os.path.abspath(filepath)))
+    with span("store.collection"):
+        client = get_client(os.path.dirname(os.path.abspath(filepath)))
 
-    # embedding the file
-    collection, existed = get_or_create_collection(client, os.path.basename(filepath))
+        # embedding the file
+        collection, existed = get_or_create_collection(client, os.path.basename(filepath))
 
-    if not existed:
-        # getnadd summary
-        summary = get_summary(text)
-        collection.modify(metadata={'summary': summary})
+    # getnadd summary
+    if checkpoint.summary is None:
+        with span("summary"):
+            summary = get_summary(text, state=checkpoint.summary_state, on_step=checkpoint.save_summary_state)
+            collection.modify(metadata={'summary': summary})
+            checkpoint.save_summary(summary)
 
-    if existed:
-        raise exception.AlreadyProcessed
+    # Generate embeddings, store and index the chunks
+    n_chunks, bm25Retriever = ingest(collection, text_chunks, checkpoint=checkpoint, pool=pool)
+
+    if not n_chunks:
+        checkpoint.remove()
+        print("No embeddings generated.")
+        return 0
+
+    with span("bm25.save"):
+        bm25Retriever.save(file_path=os.path.abspath(filepath))
+    with span("parents"):
+        index_parents(filepath, text)
+
+    with span("store.metadata"):
+        # the summary again, in case the collection was created after it
+        update_metadata(collection, summary=checkpoint.summary, **metadata)
+    checkpoint.remove()
+    get_answer_cache().invalidate(filepath)
+    return n_chunks
+
+def index_parents(filepath, text):
+    """
+    Saves the parent spans of a document (see `lib.parents`), or removes
+    them if `parent_size` is 0.
+
+    Args:
+        filepath (str): Path to the document.
+        text (str | iterable): Its text, or its consecutive text blocks.
+    """
+    if PARENT_SIZE:
+        lib.parents.save(lib.parents.parent_bounds(text, PARENT_SIZE), os.path.abspath(filepath))
+    else:
+        lib.parents.delete(os.path.abspath(filepath))
+
+def checkpoint_settings(metadata):
+    """
+    What the saved progress of a document depends on: it is discarded if any of it changed.
+
+    Args:
+        metadata (dict): The `file_metadata` of the document.
+
+    Returns:
+        dict: The settings.
+    """
+    return {
+        "file_hash": metadata["file_hash"],
+        "chunk_size": metadata["chunk_size"],
+        "overlap": metadata["overlap"],
+        "analyzer": BM25_ANALYZER,
+        "embedding_model": EMBEDDING_MODEL,
+        "summary": [S_STRATEGY, S_CHUNK_SIZE, S_OVERLAP],
+    }
+
+def analyze_batch(chunks):
+    """BM25 tokens of a batch of chunks (run in a worker process by `ingest`)."""
+    return get_analyzer(BM25_ANALYZER).analyze_many(chunks)
+
+def ingest(collection, text_chunks, batch_size=INGEST_BATCH_SIZE, checkpoint=None, pool=None):
+    """
+    Embeds, stores and BM25-indexes chunks `batch_size` at a time.
+
+    Chunks are consumed lazily and ids continue across batches, so with a
+    chunk generator only one batch of chunks and embeddings is in memory.
+    With a checkpoint, every stored batch is committed to it, and the chunks
+    it already counts are skipped. With a pool, every batch is tokenized in a
+    worker process while it is embedded, so the analyzer does not hold the
+    GIL of the indexing threads.
+
+    Args:
+        collection (Collection): The document's collection.
+        text_chunks (iterable): The chunks, in document order.
+        batch_size (int): Number of chunks per batch.
+        checkpoint (Checkpoint): The progress of the document.
+        pool (ProcessPoolExecutor): Worker processes tokenizing the batches.
+
+    Returns:
+        (int, BM25Retriever): Number of chunks stored and the fitted BM25 model.
+    """
+    n = checkpoint.chunks if checkpoint is not None else 0
+    if n:
+        postings = checkpoint.postings()
+        text_chunks = itertools.islice(text_chunks, n, None)
+    else:
+        postings = PostingsBuilder()
+    if checkpoint is not None:
+        # chunks stored after the last commit
+        stored = collection.count()
+        if stored > n:
+            collection.delete(ids=[str(i) for i in range(n, stored)])
+
+    for batch in lib.utils.batched(text_chunks, batch_size):
+        tokenized = pool.submit(analyze_batch, batch) if pool is not None else None
+        with span("embed", chunks=len(batch)):
+            embeddings = generate_embeddings(batch)
+        with span("store.add", chunks=len(batch)):
+            collection.add(documents=batch, embeddings=embeddings, ids=[str(i) for i in range(n, n + len(batch))])
+        with span("tokenize", chunks=len(batch)):
+            batch_tokens = tokenized.result() if tokenized is not None else analyze_batch(batch)
+        with span("bm25.index"):
+            postings.add(batch_tokens)
+        n += len(batch)
+        if checkpoint is not None:
+            with span("checkpoint"):
+                checkpoint.commit(n, postings)
+    count("chunks", n)
+
+    with span("bm25.fit"):
+        return n, BM25Retriever().fit_postings(postings)
+
+def is_complete(filepath):
+    """
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        bool: True if the document was processed and not interrupted.
+    """
+    return is_processed(filepath) and not lib.checkpoint.exists(filepath)
+
+def expand_paths(target):
+    """
+    Expands a CLI target into the documents it designates.
+
+    Args:
+        target (str): A file, a folder (its supported files, not recursive) or a glob pattern.
+
+    Returns:
+        list: Sorted file paths.
+    """
+    if os.path.isdir(target):
+        paths = [os.path.join(target, name) for name in os.listdir(target)]
+    elif glob.has_magic(target):
+        paths = glob.glob(target)
+    else:
+        return [target]
+    return sorted(p for p in paths if os.path.isfile(p) and is_supported(p))
+
+def unprocessed_documents(folderpath):
+    """
+    Lists the supported documents of a folder that have no collection yet.
+
+    Args:
+        folderpath (str): The folder path.
+
+    Returns:
+        list: Sorted file paths.
+    """
+    import lib.catalog
+    filepaths = expand_paths(folderpath)
+    collections = lib.catalog.list_collections(folderpath)
+    if collections is None:
+        return [f for f in filepaths if not is_complete(f)]
+    return [f for f in filepaths if os.path.basename(f) not in set(collections) or lib.checkpoint.exists(f)]
+
+def process_documents(filepaths, workers=WORKERS):
+    """
+    Processes many documents at once.
+
+    Extraction runs in a pool of `workers` processes (see `prepare_document`).
+    Extracted documents are chunked and indexed batch by batch by `workers`
+    threads in this process, as single documents are, with the BM25
+    tokenization of every batch sent to the same pool (see `ingest`), so all
+    files share the same embedding executor and LLM request budget. Each
+    file still gets its collection in its folder's database. Prints per-file
+    progress and a throughput summary.
+
+    Args:
+        filepaths (list): Paths of the documents.
+        workers (int): Number of worker processes (and indexing threads).
+
+    Returns:
+        dict: Counts of processed, skipped and failed documents and of stored chunks.
+    """
+    stats = {"processed": 0, "skipped": 0, "failed": 0, "chunks": 0}
+    pending = []
+    for filepath in filepaths:
+        if is_complete(filepath):
+            stats["skipped"] += 1
+            print(f"Skipping {filepath}: already processed.")
+        else:
+            pending.append(filepath)
+
+    # create the folder databases up front rather than racing on them from the indexing threads
+    for folder in {os.path.dirname(os.path.abspath(f)) for f in pending}:
+        get_client(folder)
+
+    start = time.perf_counter()
+    with worker_pool(workers) as pool, ThreadPoolExecutor(max_workers=workers) as indexers:
+        # extractions are submitted `workers` at a time, so the tokenization of
+        # the batches being indexed does not queue behind all of them
+        queued = iter(pending)
+        running = {pool.submit(prepare_document, f): ("prepare", f) for f in itertools.islice(queued, workers)}
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, filepath = running.pop(future)
+                if stage == "prepare":
+                    for f in itertools.islice(queued, 1):
+                        running[pool.submit(prepare_document, f)] = ("prepare", f)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"Failed {filepath}: {e!r}")
+                    continue
+                if stage == "prepare":
+                    running[indexers.submit(process_document, filepath, result, pool)] = ("index", filepath)
+                else:
+                    stats["processed"] += 1
+                    stats["chunks"] += result
+                    done = stats["processed"] + stats["failed"]
+                    print(f"[{done}/{len(pending)}] {filepath}: {result} chunks ({time.perf_counter() - start:.1f}s)")
+
+    elapsed = time.perf_counter() - start
+    if stats["processed"]:
+        print(f"Processed {stats['processed']} documents, {stats['chunks']} chunks in {elapsed:.1f}s "
+              f"({stats['processed'] / elapsed:.2f} docs/s, {stats['chunks'] / elapsed:.1f} chunks/s).")
+    return stats
+
+def file_metadata(filepath):
+    """
+    Metadata used to tell whether a processed file changed since.
+
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        dict: The file's hash and mtime and the chunking parameters.
+    """
+    return {
+        "file_hash": lib.utils.file_hash(filepath),
+        "file_mtime": os.path.getmtime(filepath),
+        "chunk_size": CHUNK_SIZE,
+        "overlap": OVERLAP,
+        "parent_size": PARENT_SIZE,
+    }
+
+def is_modified(filepath, metadata):
+    """
+    Checks a file against the metadata stored when it was processed.
+
+    The mtime is checked first, so unchanged files are not hashed.
+
+    Args:
+        filepath (str): Path to the document.
+        metadata (dict): The collection metadata.
+
+    Returns:
+        bool: True if the content or the chunking parameters changed.
+    """
+    if metadata.get("chunk_size") != CHUNK_SIZE or metadata.get("overlap") != OVERLAP:
+        return True
+    if metadata.get("parent_size") != PARENT_SIZE:
+        return True
+    if metadata.get("file_mtime") == os.path.getmtime(filepath):
+        return False
+    return metadata.get("file_hash") != lib.utils.file_hash(filepath)
+
+def update_document(filepath):
+    """
+    Re-indexes an edited document incrementally.
+
+    The new chunk set is diffed against the stored ids/documents: only added
+    or modified chunks are embedded and upserted, chunks past the new end are
+    deleted, and the BM25 statistics are updated instead of refitted. Files
+    that were never processed are processed from scratch.
+
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        bool: True if the document was (re)indexed, False if it was up to date.
+    """
+    if not os.path.isfile(filepath):
+        print(f"File {filepath} does not exist.")
+        raise exception.FileNotFoundError
+
+    if not is_complete(filepath):
+        process_document(filepath)
+        return True
+
+    collection = get_collection(os.path.dirname(os.path.abspath(filepath)), os.path.basename(filepath))
+
+    if not is_modified(filepath, collection.metadata or {}):
+        return False
+
+    # read as process_document reads it, so unchanged files give the same chunks
+    text = read_markdown(filepath)
+    if not next(iter(text), ""):
+        print(f"No text extracted from {filepath}.")
+        raise exception.ProcessingError
 
-    # Chunk text
     text_chunks = lib.utils.chunk_text(text, CHUNK_SIZE, overlap=OVERLAP)
+    stored = collection.get(include=["documents"])
+    stored = dict(zip(stored["ids"], stored["documents"]))
 
-    # Generate embeddings
-    embeddings = generate_embeddings(text_chunks)
+    changed = {i: chunk for i, chunk in enumerate(text_chunks) if stored.get(str(i)) != chunk}
+    removed = [i for i in stored if int(i) >= len(text_chunks)]
 
-    if not embeddings:
-        print("No embeddings generated.")
-        return
-    
-    bm25Retriever = BM25Retriever()
-    bm25Retriever.fit(text_chunks)
-    
-    collection.add(
-        documents=text_chunks,
-        embeddings=embeddings,
-        ids=[str(i) for i in range(len(text_chunks))]
-    )
+    if changed:
+        collection.upsert(
+            documents=list(changed.values()),
+            embeddings=generate_embeddings(list(changed.values())),
+            ids=[str(i) for i in changed]
+        )
+    if removed:
+        collection.delete(ids=removed)
+
+    bm25Retriever = BM25Retriever.load(file_path=os.path.abspath(filepath))
+    bm25Retriever.update(changed, len(text_chunks))
+    bm25Retriever.save(file_path=os.path.abspath(filepath))
+    index_parents(filepath, text)
 
-    bm25Retriever.save_json(file_path=os.path.abspath(filepath))
+    summary = get_summary(text) if changed or removed else collection.metadata.get("summary", "")
+    update_metadata(collection, summary=summary, **file_metadata(filepath))
+    get_answer_cache().invalidate(filepath)
+    print(f"Updated {len(changed)} chunks, removed {len(removed)} chunks.")
+    return True
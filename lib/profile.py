@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+# Lightweight spans and counters, enabled by `xpl --profile`. While disabled,
+# `span` returns a shared no-op context manager and `count` returns at once,
+# so instrumented code pays one global lookup per call.
+#
+# Spans nest per thread. A span opened on a thread with no open span (a pool
+# worker) is attached to the innermost open span of the main thread, which is
+# the one waiting for the pool.
+
+_enabled = False
+_origin = time.perf_counter()
+_lock = threading.Lock()
+_stacks = dict()
+_spans = []
+_counters = defaultdict(int)
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def enabled():
+    return _enabled
+
+def reset():
+    """Drops the recorded spans and counters."""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+class _Span:
+    __slots__ = ("name", "args", "path", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        stack = _stacks.setdefault(threading.get_ident(), [])
+        if not stack:
+            main = _stacks.get(threading.main_thread().ident)
+            parent = main[-1].path if main else ()
+        else:
+            parent = stack[-1].path
+        self.path = parent + (self.name,)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _stacks[threading.get_ident()].pop()
+        with _lock:
+            _spans.append((self.path, threading.get_ident(), self.start, end, self.args))
+        return False
+
+def span(name, **args):
+    """
+    Times a block: `with span("embed", chunks=n): ...`.
+
+    Args:
+        name (str): The stage name.
+        **args: Values attached to the span in the trace.
+
+    Returns:
+        A context manager.
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, args)
+
+def count(name, n=1):
+    """Adds `n` to the counter `name`."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+def tree():
+    """
+    Aggregates the spans by their path.
+
+    Returns:
+        list: (path, calls, seconds) in the order the paths were first entered.
+    """
+    with _lock:
+        spans = sorted(_spans, key=lambda s: s[2])
+    calls, seconds = defaultdict(int), defaultdict(float)
+    first = dict()
+    for path, _, start, end, _ in spans:
+        calls[path] += 1
+        seconds[path] += end - start
+        first.setdefault(path, start)
+    # depth first, siblings in the order they were first entered
+    order = sorted(calls, key=lambda path: tuple(first.get(path[:i + 1], 0) for i in range(len(path))))
+    return [(path, calls[path], seconds[path]) for path in order]
+
+def report():
+    """
+    Formats the timing tree and the counters.
+
+    Returns:
+        str: The report.
+    """
+    lines = []
+    rows = tree()
+    width = max((2 * (len(path) - 1) + len(path[-1]) for path, _, _ in rows), default=0)
+    for path, calls, seconds in rows:
+        label = "  " * (len(path) - 1) + path[-1]
+        lines.append(f"{label:<{width}}  {calls:>6} x  {seconds:>9.3f}s")
+    values = counters()
+    if values:
+        lines.append("")
+        width = max(len(name) for name in values)
+        lines.extend(f"{name:<{width}}  {value:>12}" for name, value in sorted(values.items()))
+    return "\n".join(lines)
+
+def write_trace(path):
+    """
+    Writes the spans and counters in the Chrome trace event format
+    (chrome://tracing, Perfetto).
+
+    Args:
+        path (str): The output file.
+    """
+    with _lock:
+        spans, values = list(_spans), dict(_counters)
+    pid = os.getpid()
+    events = [
+        {"name": span_path[-1], "cat": "/".join(span_path[:-1]), "ph": "X", "pid": pid, "tid": tid,
+         "ts": (start - _origin) * 1e6, "dur": (end - start) * 1e6, "args": args}
+        for span_path, tid, start, end, args in spans
+    ]
+    end = max((s[3] for s in spans), default=time.perf_counter())
+    events.extend({"name": name, "ph": "C", "pid": pid, "tid": 0, "ts": (end - _origin) * 1e6, "args": {name: value}}
+                  for name, value in values.items())
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": values}}, f)
@@ -1,8 +1,20 @@
+import hashlib
+import json
 import os
-import requests
-from lib.config import EMBEDDING_API_URL, EMBEDDING_MODEL, LLM_API_URL, LLM_MODEL, N_DOCS, ALPHA, BM25_PATH
-from lib.db import initialize_chroma_client
-from lib.bm25 import BM25Retriever
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lib.config import (N_DOCS, ALPHA, BM25_PATH, RETRIEVAL, CANDIDATES, FUSION, RRF_K, QUERY_WORKERS, FOLDER_SUMMARIES,
+                        EMBEDDING_MODEL, LLM_MODEL, BM25_ANALYZER, CACHE_ANSWERS, CACHE_ANSWER_SIMILARITY,
+                        CONTEXT_TOKENS, CHARS_PER_TOKEN, LLM_CONCURRENCY)
+from lib.db import get_collection, list_collections
+from lib.bm25 import get_retriever, index_exists
+from lib.cache import get_answer_cache
+from lib.context import build_context, context_size
+import lib.parents
+from lib.embedding import embed, embed_one
+from lib.llm import generate, generate_stream
+from lib.profile import span, count
 import numpy as np
 
 def min_max_normalize(arr):
@@ -24,9 +36,141 @@ def min_max_normalize(arr):
     
     return (arr - min_val) / (max_val - min_val)
 
+def cosine_similarity(embeddings, query_embedding):
+    embeddings = np.asarray(embeddings, dtype=np.float64).reshape(len(embeddings), -1)
+    query_embedding = np.asarray(query_embedding, dtype=np.float64)
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
+    return embeddings @ query_embedding / np.where(norms == 0, 1, norms)
+
+def rrf_scores(scores, k=RRF_K):
+    """Reciprocal rank fusion contribution of every score (NaN = not ranked)."""
+    ranked = ~np.isnan(scores)
+    ranks = np.empty(len(scores))
+    ranks[np.flatnonzero(ranked)[np.argsort(-scores[ranked], kind="stable")]] = np.arange(ranked.sum())
+    return np.where(ranked, 1 / (k + ranks + 1), 0)
+
+def ann_search(collection, query_embeddings, candidates=CANDIDATES):
+    """
+    Takes the top `candidates` ANN hits of every query with one store query.
+
+    Args:
+        collection (Collection): The document's collection.
+        query_embeddings (list): The embedded queries.
+        candidates (int): Number of hits per query.
+
+    Returns:
+        list: (chunk ids, cosine similarities) of every query, best first.
+    """
+    # chroma warns when asked for more results than the collection holds
+    candidates = max(1, min(candidates, collection.count()))
+    with span("store.query", n_results=candidates, queries=len(query_embeddings)):
+        ann = collection.query(query_embeddings=list(query_embeddings), n_results=candidates, include=["distances"])
+    # (1 - cosine distance) = cosine similarity
+    return [(np.array([int(i) for i in ids], dtype=np.int64), 1 - np.array(distances))
+            for ids, distances in zip(ann["ids"], ann["distances"])]
+
+def get_candidates(collection, bm25R, query_embedding, query_text, candidates=CANDIDATES, fusion=FUSION, ann=None):
+    """
+    Takes the top `candidates` ANN hits and the top `candidates` BM25 hits of a document.
+
+    For min-max fusion, the missing score of a candidate found by one
+    retriever only is computed directly (BM25 on its postings, cosine on its
+    stored embedding). Rank fusion only needs the ranks, so it is left NaN.
+
+    Args:
+        collection (Collection): The document's collection.
+        bm25R (BM25Retriever): The document's BM25 index.
+        query_embedding (list): The embedded query.
+        query_text (str): The user query.
+        candidates (int): Number of hits taken from each retriever.
+        fusion (str): "minmax" or "rrf".
+        ann (tuple): The ANN hits of the query, if already taken by `ann_search`.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): Chunk ids of the union, their
+        cosine similarities and their BM25 scores.
+    """
+    ann_ids, ann_scores = ann if ann is not None else ann_search(collection, [query_embedding], candidates)[0]
+    candidates = max(1, min(candidates, collection.count()))
+    with span("bm25.top_k"):
+        bm25_ids, bm25_scores = bm25R.top_k(query_text, candidates)
+
+    ids = np.union1d(ann_ids, bm25_ids)
+    semantic = np.full(len(ids), np.nan)
+    semantic[np.searchsorted(ids, ann_ids)] = ann_scores
+    lexical = np.full(len(ids), np.nan)
+    lexical[np.searchsorted(ids, bm25_ids)] = bm25_scores
+
+    if fusion != "rrf":
+        missing = ids[np.isnan(semantic)]
+        if len(missing):
+            with span("store.get_embeddings", ids=len(missing)):
+                stored = collection.get(ids=[str(i) for i in missing], include=["embeddings"])
+            by_id = dict(zip((int(i) for i in stored["ids"]), cosine_similarity(stored["embeddings"], query_embedding)))
+            semantic[np.isnan(semantic)] = [by_id.get(int(i), 0) for i in missing]
+        # docs outside the BM25 top-k may still share a (rarer) term with the query
+        with span("bm25.score_docs"):
+            lexical[np.isnan(lexical)] = bm25R.score_docs(query_text, ids[np.isnan(lexical)])
+    return ids, semantic, lexical
+
+def fuse_scores(semantic, lexical, fusion=FUSION, alpha=ALPHA):
+    """
+    Args:
+        semantic (np.ndarray): Cosine similarities of the candidates.
+        lexical (np.ndarray): BM25 scores of the candidates.
+        fusion (str): "minmax" or "rrf".
+        alpha (float): Weight of BM25 (1 - alpha for the semantic scores).
+
+    Returns:
+        np.ndarray: The hybrid score of every candidate.
+    """
+    if not len(semantic):
+        return np.zeros(0)
+    if fusion == "rrf":
+        return alpha * rrf_scores(lexical) + (1 - alpha) * rrf_scores(semantic)
+    return alpha * min_max_normalize(lexical) + (1 - alpha) * min_max_normalize(semantic)
+
+def hybrid_search(collection, bm25R, query_embedding, query_text, n_results=N_DOCS,
+                  candidates=CANDIDATES, fusion=FUSION, alpha=ALPHA, ann=None):
+    """
+    Candidate-limited hybrid retrieval: only the union of the top hits of
+    both retrievers is fused (see `get_candidates`).
+
+    Returns:
+        (np.ndarray, np.ndarray): Chunk ids and fused scores, best first.
+    """
+    ids, semantic, lexical = get_candidates(collection, bm25R, query_embedding, query_text, candidates, fusion, ann)
+    scores = fuse_scores(semantic, lexical, fusion, alpha)
+    order = np.argsort(-scores, kind="stable")[:n_results]
+    return ids[order], scores[order]
+
+def exhaustive_search(collection, bm25R, query_embedding, query_text, n_results=N_DOCS, alpha=ALPHA):
+    """
+    Hybrid retrieval scoring every chunk of the document with both retrievers.
+
+    Returns:
+        (np.ndarray, np.ndarray): Chunk ids and fused scores, best first.
+    """
+    results = collection.query(
+        query_embeddings=[query_embedding], n_results=collection.count(), include=["distances"]
+    )
+
+    ids = np.array([int(i) for i in results["ids"][0]]) # get ids list (its sorted by score)
+    dists = np.array(results["distances"][0]) # sorted distances
+    #unsort to rerank
+    scores_semantic = min_max_normalize((1 - dists[np.argsort(ids)])) # get (1 - 1 - cosine) (to get max)
+    scores_bm25 = min_max_normalize(bm25R.score_query(query_text))
+
+    hybrid_scores = alpha * scores_bm25 + (1 - alpha) * scores_semantic
+    order = np.argsort(-hybrid_scores, kind="stable")[:n_results]
+    return order, hybrid_scores[order]
+
 def search_document(filepath, query_text):
     """
     Searches the document for relevant context using ChromaDB.
+
+    Overlapping hits are stitched into spans and packed into the context
+    token budget (see `lib.context.build_context`).
     
     Args:
         filepath (str): Path to the document.
@@ -35,39 +179,141 @@ def search_document(filepath, query_text):
     Returns:
         (Context, summary) (str, str): Retrieved context and summary from the document.
     """
+    with span("embed_query"):
+        query_embedding = get_embedding(query_text)
+    contexts, summary = search_document_batch(filepath, [query_text], [query_embedding])
+    return contexts[0], summary
+
+def search_document_batch(filepath, query_texts, query_embeddings):
+    """
+    Searches the document for the context of several queries at once.
+
+    The collection and BM25 index are loaded once, the ANN hits of all the
+    queries are taken with a single store query and the chunks of all the
+    results are fetched together.
+
+    Args:
+        filepath (str): Path to the document.
+        query_texts (list): The user queries.
+        query_embeddings (list): Their embeddings.
+
+    Returns:
+        (list, str): The context of every query and the summary of the document.
+    """
     db = os.path.dirname(os.path.abspath(filepath))
     filename = os.path.basename(filepath)
-    client = initialize_chroma_client(db)
-    collection = client.get_collection(filename)
+    with span("store.collection"):
+        collection = get_collection(db, filename)
+    with span("bm25.load"):
+        bm25R = get_retriever(os.path.abspath(filepath))
 
-    query_embedding = get_embedding(query_text)
-    results = collection.query(
-        query_embeddings=[query_embedding], n_results=N_DOCS,
-    )
+    with span("search", retrieval=RETRIEVAL, queries=len(query_texts)):
+        if RETRIEVAL == "exhaustive":
+            ranked = [exhaustive_search(collection, bm25R, e, t) for t, e in zip(query_texts, query_embeddings)]
+        else:
+            anns = ann_search(collection, query_embeddings)
+            ranked = [hybrid_search(collection, bm25R, e, t, ann=ann)
+                      for t, e, ann in zip(query_texts, query_embeddings, anns)]
 
-    test = collection.query(
-        query_embeddings=[query_embedding], n_results=collection.count(), include=["distances"]
-    )
+    chunk_size, overlap, hits = document_hits(filepath, collection, ranked)
+    contexts = [build_context([(None, chunk_size, overlap, query_hits)])[0] for query_hits in hits]
+    return contexts, (collection.metadata or {}).get("summary", "no summary generated")
 
-    print(test["ids"][:N_DOCS])
+def document_hits(filepath, collection, ranked):
+    """
+    Fetches the text of the ranked chunks of a document, for all the queries at once.
 
-    ids = np.array([int(i) for i in test["ids"][0]]) # get ids list (its sorted by score)
-    dists = np.array(test["distances"][0]) # sorted distances
-    #unsort to rerank
-    scores_semantic = min_max_normalize((1 - dists[np.argsort(ids)])) # get (1 - 1 - cosine) (to get max)
-    bm25R = BM25Retriever.load_json(file_path=os.path.abspath(filepath))
-    scores_bm25 = min_max_normalize(np.array(bm25R.score_query(query_text)))
+    If the document has a parent index (see `lib.parents`), the chunks are
+    replaced by their deduplicated parents.
+
+    Args:
+        filepath (str): Path to the document.
+        collection (Collection): Its collection.
+        ranked (list): (chunk ids, scores) of every query, best first.
+
+    Returns:
+        (int, int, list): The chunk size and overlap to stitch the hits with
+        (None for parents, which do not overlap) and the (id, score, text)
+        hits of every query, best first.
+    """
+    metadata = collection.metadata or {}
+    chunk_size, overlap = metadata.get("chunk_size"), metadata.get("overlap")
+    bounds = lib.parents.load(os.path.abspath(filepath)) if metadata.get("parent_size") and chunk_size else None
+    if bounds is not None and len(bounds):
+        with span("store.get_parents"):
+            hits = lib.parents.expand(collection, ranked, bounds, chunk_size, overlap)
+        count("parents.chunks", sum(len(ids) for ids, _ in ranked))
+        count("parents.returned", sum(len(query_hits) for query_hits in hits))
+        return None, None, hits
+
+    wanted = sorted({int(i) for ids, _ in ranked for i in ids})
+    with span("store.get_documents", ids=len(wanted)):
+        results = collection.get(ids=[str(i) for i in wanted], include=["documents"])
+    documents = dict(zip(results["ids"], results["documents"]))
+    # keep the fused score order, get() does not preserve it
+    return chunk_size, overlap, [
+        [(int(i), float(score), documents[str(i)]) for i, score in zip(ids, scores) if str(i) in documents]
+        for ids, scores in ranked
+    ]
+
+def search_folder(folderpath, query_text, n_results=N_DOCS, workers=QUERY_WORKERS):
+    """
+    Searches every processed document of a folder for relevant context.
+
+    The query is embedded once; the candidates of every document (see
+    `get_candidates`, at most `n_results` per retriever since no document
+    can contribute more) are gathered in parallel and fused together, so the
+    scores are comparable across documents. BM25 models go through the
+    `get_retriever` LRU and are memory-mapped, so only a bounded number of
+    them is loaded at any time.
+
+    Args:
+        folderpath (str): Path to the folder.
+        query_text (str): The user query.
+        n_results (int): Number of chunks to return.
+        workers (int): Documents searched concurrently.
+
+    Returns:
+        (str, str, list): Retrieved context (see `lib.context.build_context`) with the
+        source of every span, summaries of the best sources, and the sources ordered by their best span.
+    """
+    folderpath = os.path.abspath(folderpath)
+    names = [name for name in list_collections(folderpath) if index_exists(os.path.join(folderpath, name))]
+    with span("embed_query"):
+        query_embedding = get_embedding(query_text)
+
+    def candidates_of(name):
+        with span("document"):
+            collection = get_collection(folderpath, name)
+            with span("bm25.load"):
+                bm25R = get_retriever(os.path.join(folderpath, name))
+            return collection, get_candidates(collection, bm25R, query_embedding, query_text, min(CANDIDATES, n_results))
 
-    hybrid_scores = ALPHA * scores_bm25 + (1 - ALPHA) * scores_semantic
-    ids = [str(i) for i in np.argsort(-hybrid_scores).tolist()[:N_DOCS]]
+    with span("search", documents=len(names)), ThreadPoolExecutor(max_workers=workers) as executor:
+        searched = list(executor.map(candidates_of, names))
+    if not searched:
+        return "", "", []
 
-    results = collection.get(ids=ids)
-    print(ids)
-    print(results)
+    owners = np.concatenate([np.full(len(ids), n) for n, (_, (ids, _, _)) in enumerate(searched)])
+    ids = np.concatenate([c[0] for _, c in searched])
+    scores = fuse_scores(np.concatenate([c[1] for _, c in searched]), np.concatenate([c[2] for _, c in searched]))
+    order = np.argsort(-scores, kind="stable")[:n_results]
 
-    return "".join(f"{i+1}. "+doc+"\n" for i, doc in enumerate(results["documents"])), collection.metadata.get("summary", "no summary generated")
+    owners, ids, scores = owners[order], ids[order], scores[order]
+    hits, collections = [], dict()
+    for owner in dict.fromkeys(owners.tolist()):
+        collection, selected = searched[owner][0], owners == owner
+        chunk_size, overlap, (found,) = document_hits(
+            os.path.join(folderpath, collection.name), collection, [(ids[selected], scores[selected])])
+        hits.append((collection.name, chunk_size, overlap, found))
+        collections[collection.name] = collection.metadata or {}
+
+    context, sources = build_context(hits)
+    summary = "".join(
+        f"{name}: {collections[name].get('summary', 'no summary generated')}\n" for name in sources[:FOLDER_SUMMARIES]
+    )
+    return context, summary, sources
 
-# defiend as well in processor.py - bad practice
 def get_embedding(text):
     """
     Generates an embedding for the given text using the local Ollama API.
@@ -78,51 +324,264 @@ def get_embedding(text):
     Returns:
         list: The embedding vector.
     """
-    response = requests.post(
-        EMBEDDING_API_URL,
-        json={"model": EMBEDDING_MODEL, "prompt": text}
-    )
-    response.raise_for_status()
-    return response.json().get("embedding", [])
+    return embed_one(text)
+
+class AnswerStream:
+    """
+    Incrementally extracts the "answer" field from a streamed JSON response.
+
+    `feed` receives raw tokens as generated and returns the decoded part of
+    the answer string they complete, so it can be printed right away.
+    """
+
+    START = re.compile(r'"answer"\s*:?\s*"')
+    ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", '"': '"', "\\": "\\", "/": "/"}
+
+    def __init__(self):
+        self.buffer = ""
+        self.state = "seek"
+        self.started = False
+
+    def feed(self, token):
+        self.buffer += token
+        out = []
+        if self.state == "seek":
+            match = self.START.search(self.buffer)
+            if not match:
+                return ""
+            self.buffer = self.buffer[match.end():]
+            self.state = "in"
+            self.started = True
+
+        while self.state == "in" and self.buffer:
+            char = self.buffer[0]
+            if char == "\\":
+                if len(self.buffer) < 2 or (self.buffer[1] == "u" and len(self.buffer) < 6):
+                    break  # wait for the rest of the escape sequence
+                if self.buffer[1] == "u":
+                    code = int(self.buffer[2:6], 16)
+                    if 0xD800 <= code <= 0xDBFF:
+                        # characters outside the BMP are escaped as a surrogate pair
+                        if len(self.buffer) < 12 and "\\u".startswith(self.buffer[6:8]):
+                            break  # wait for the low surrogate
+                        if self.buffer[6:8] == "\\u" and 0xDC00 <= int(self.buffer[8:12], 16) <= 0xDFFF:
+                            out.append(json.loads('"' + self.buffer[:12] + '"'))
+                            self.buffer = self.buffer[12:]
+                            continue
+                    # a lone surrogate cannot be encoded, so it is replaced
+                    out.append("\ufffd" if 0xD800 <= code <= 0xDFFF else chr(code))
+                    self.buffer = self.buffer[6:]
+                else:
+                    out.append(self.ESCAPES.get(self.buffer[1], self.buffer[1]))
+                    self.buffer = self.buffer[2:]
+            elif char == '"':
+                self.state = "done"
+                self.buffer = ""
+            else:
+                out.append(char)
+                self.buffer = self.buffer[1:]
+        return "".join(out)
+
+def extract_answer(response):
+    """
+    Returns the "answer" field of a JSON response, or the raw response if it has none.
+    
+    Args:
+        response (str): The LLM response.
+    
+    Returns:
+        str: The answer.
+    """
+    try:
+        answer = json.loads(response).get("answer")
+    except (ValueError, AttributeError):
+        return response
+    return answer if isinstance(answer, str) else response
+
+def _answer(prompt, on_token=None):
+    num_ctx = context_size(prompt)
+    with span("llm", num_ctx=num_ctx):
+        if on_token is None:
+            return generate(prompt, num_ctx=num_ctx)
+
+        stream = AnswerStream()
+        return generate_stream(prompt, lambda token: on_token(stream.feed(token)), num_ctx=num_ctx)
+
+def answer_scope(filepath):
+    """
+    The answer cache scope of a document: a hash of everything besides the
+    question an answer depends on.
+
+    Args:
+        filepath (str): Path to the document.
+
+    Returns:
+        str: The scope.
+    """
+    collection = get_collection(os.path.dirname(os.path.abspath(filepath)), os.path.basename(filepath))
+    metadata = (collection.metadata if collection is not None else None) or {}
+    key = [os.path.abspath(filepath), metadata.get("file_hash"), metadata.get("chunk_size"), metadata.get("overlap"),
+           metadata.get("parent_size"), LLM_MODEL, EMBEDDING_MODEL, BM25_ANALYZER, RETRIEVAL, CANDIDATES, FUSION, RRF_K,
+           ALPHA, N_DOCS, CONTEXT_TOKENS, CHARS_PER_TOKEN]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+def document_prompt(summary, context, question):
+    return f'''
+    You are a chatbot tasked with answering the user question about a document given
+    the document contexts of the document, as well as the provided summary.
+    The summary: \n{summary} \nThe contexts: \n{context} \nUser Question: {question}\n
+
+    Generate a json with the following structure:
+    {{
+        "answer": "The answer to the question asked by the user"
+    }}
+
+    '''
 
-def answer_question(filepath, question):
+def answer_question(filepath, question, on_token=None, use_cache=CACHE_ANSWERS):
     """
     Answers a question based on the document's content using the LLM.
+
+    Responses are cached (see `lib.cache.AnswerCache`); a cached response is
+    passed to `on_token` at once.
     
     Args:
         filepath (str): Path to the document.
         question (str): The question to answer.
+        on_token (callable): If given, the response is streamed and every
+            decoded piece of the answer is passed to it as soon as it arrives.
+        use_cache (bool): Check and fill the answer cache.
     
     Returns:
         str: AI-generated response.
     """
-    context, summary = search_document(filepath, question)
+    if use_cache:
+        with span("answer_cache"):
+            scope = answer_scope(filepath)
+            # the query embedding is cached, so retrieval below does not embed it again
+            embedding = get_embedding(question) if CACHE_ANSWER_SIMILARITY else None
+            response = get_answer_cache().get(scope, question, embedding, CACHE_ANSWER_SIMILARITY)
+        if response is not None:
+            count("answer_cache.hits")
+            if on_token is not None:
+                on_token(extract_answer(response))
+            return response
+        count("answer_cache.misses")
+
+    with span("retrieve"):
+        context, summary = search_document(filepath, question)
+
+    response = _answer(document_prompt(summary, context, question), on_token)
+    if use_cache:
+        get_answer_cache().put(scope, os.path.abspath(filepath), question, response, embedding)
+    return response
+
+def answer_questions(filepath, questions, on_result, workers=LLM_CONCURRENCY, use_cache=CACHE_ANSWERS):
+    """
+    Answers a set of questions about a document (or a folder).
+
+    For a document, the questions are embedded in batched calls and
+    retrieved together (see `search_document_batch`), then answered by
+    `workers` concurrent generations. Folder questions are each answered by
+    `answer_folder`, `workers` at a time. Every result is passed to
+    `on_result` as soon as it is ready, so results arrive in completion order.
+
+    Args:
+        filepath (str): Path to the document or folder.
+        questions (list): The questions.
+        on_result (callable): Called with a dict per question: its "index" in
+            `questions`, the "question", the "answer" (or an "error"),
+            "cached", "latency_s" (seconds spent answering it) and
+            "elapsed_s" (seconds since the batch started); folder results
+            also have the "sources".
+        workers (int): Questions answered concurrently.
+        use_cache (bool): Check and fill the answer cache (documents only).
+    """
+    start = time.perf_counter()
+
+    def result(index, started, **values):
+        now = time.perf_counter()
+        return dict(index=index, question=questions[index], **values,
+                    latency_s=round(now - started, 4), elapsed_s=round(now - start, 4))
+
+    if os.path.isdir(filepath):
+        def ask_folder(index):
+            started = time.perf_counter()
+            try:
+                response, sources = answer_folder(filepath, questions[index])
+            except Exception as e:
+                return result(index, started, error=repr(e), cached=False)
+            return result(index, started, answer=extract_answer(response), sources=sources, cached=False)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for future in as_completed([executor.submit(ask_folder, i) for i in range(len(questions))]):
+                on_result(future.result())
+        return
+
+    with span("embed_query", questions=len(questions)):
+        embeddings = embed(questions)
+
+    pending = list(range(len(questions)))
+    if use_cache:
+        with span("answer_cache"):
+            scope = answer_scope(filepath)
+            cache = get_answer_cache()
+            pending = []
+            for i, question in enumerate(questions):
+                started = time.perf_counter()
+                response = cache.get(scope, question, embeddings[i], CACHE_ANSWER_SIMILARITY)
+                if response is None:
+                    pending.append(i)
+                else:
+                    on_result(result(i, started, answer=extract_answer(response), cached=True))
+        count("answer_cache.hits", len(questions) - len(pending))
+        count("answer_cache.misses", len(pending))
+    if not pending:
+        return
+
+    with span("retrieve", questions=len(pending)):
+        contexts, summary = search_document_batch(filepath, [questions[i] for i in pending], [embeddings[i] for i in pending])
+
+    def ask_document(index, context):
+        started = time.perf_counter()
+        try:
+            response = _answer(document_prompt(summary, context, questions[index]))
+        except Exception as e:
+            return result(index, started, error=repr(e), cached=False)
+        if use_cache:
+            cache.put(scope, os.path.abspath(filepath), questions[index], response, embeddings[index])
+        return result(index, started, answer=extract_answer(response), cached=False)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for future in as_completed([executor.submit(ask_document, i, c) for i, c in zip(pending, contexts)]):
+            on_result(future.result())
+
+def answer_folder(folderpath, question, on_token=None):
+    """
+    Answers a question based on all the processed documents of a folder.
+
+    Args:
+        folderpath (str): Path to the folder.
+        question (str): The question to answer.
+        on_token (callable): See `answer_question`.
+
+    Returns:
+        (str, list): AI-generated response and the documents the context came from.
+    """
+    with span("retrieve"):
+        context, summary, sources = search_folder(folderpath, question)
 
     prompt = f'''
-    You are a chatbot tasked with answering the user question about a document given
-    the document contexts of the document, as well as the provided summary.
-    The summary: \n{summary} \nThe contexts: \n{context} \nUser Question: {question}\n
+    You are a chatbot tasked with answering the user question about a collection of documents given
+    contexts from the documents, each prefixed with the name of its document in brackets,
+    as well as the summaries of the most relevant documents.
+    The summaries: \n{summary} \nThe contexts: \n{context} \nUser Question: {question}\n
 
     Generate a json with the following structure:
-    {
-        "answer" "The answer to the question asked by the user"
-    }
+    {{
+        "answer": "The answer to the question asked by the user, naming the documents it is based on"
+    }}
 
     '''
- 
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(
-        LLM_API_URL,
-        headers=headers,
-        json={"model": LLM_MODEL, "prompt": prompt, "stream": False,
-        "format": "json",
-        "options": {
-            "temperature": 0,
-            "num_ctx": 10000
-        }}
-    )
-    response.raise_for_status()
-    
-    return response.json().get("response", "No response generated.")
+
+    return _answer(prompt, on_token), sources
@@ -1,11 +1,28 @@
-import requests
-from lib.config import LLM_API_URL, LLM_MODEL, S_CHUNK_SIZE, S_OVERLAP, MAX_SUMMARY_LEN
-from lib.utils import chunk_text
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from lib.config import S_CHUNK_SIZE, S_OVERLAP, MAX_SUMMARY_LEN, S_STRATEGY, S_FAN_IN, LLM_CONCURRENCY
+from lib.utils import iter_chunks
+from lib.llm import generate
+from lib.profile import span, count
 import tqdm
 
-def get_summary(md:str):
+def get_summary(md, state=None, on_step=None):
+    """
+    Args:
+        md: markdown content of file, as a str or an iterable of consecutive text blocks
+        state (dict): State passed to `on_step` by an interrupted run, to resume from.
+        on_step (callable): Called with the (json serializable) state after every LLM step.
+
+    Returns:
+        str: AI-generated summary.
+    """
     # return _get_summary(md)
-    return get_rolling_summary(md, chunk_size=S_CHUNK_SIZE, overlap=S_OVERLAP, max_summary_len=MAX_SUMMARY_LEN)
+    if S_STRATEGY == "map_reduce":
+        return get_map_reduce_summary(md, chunk_size=S_CHUNK_SIZE, overlap=S_OVERLAP, max_summary_len=MAX_SUMMARY_LEN, fan_in=S_FAN_IN,
+                                      state=state, on_step=on_step)
+    return get_rolling_summary(md, chunk_size=S_CHUNK_SIZE, overlap=S_OVERLAP, max_summary_len=MAX_SUMMARY_LEN,
+                               state=state, on_step=on_step)
 
 def _get_summary(md: str):
     """
@@ -24,22 +41,7 @@ def _get_summary(md: str):
     summary:
     '''
  
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(
-        LLM_API_URL,
-        headers=headers,
-        json={"model": LLM_MODEL, "prompt": prompt, "stream": False, 
-        "format": "json",
-        "options": {
-            "temperature": 0,
-            "num_ctx": 10000
-        }}
-    )
-    response.raise_for_status()
-    
-    return response.json().get("response", "No summary provided")
+    return generate(prompt, default="No summary provided")
 
 def get_joint_summary_input(current_summary, previous_summary, chunk, max_summary_len):
     """
@@ -73,51 +75,131 @@ def get_joint_summary_input(current_summary, previous_summary, chunk, max_summar
         The summary should converge toward a stable representation of the entire document's key information.
     """
  
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(
-        LLM_API_URL,
-        headers=headers,
-        json={"model": LLM_MODEL, "prompt": prompt, "stream": False, 
-        "format": "json",
-        "options": {
-            "temperature": 0,
-            "num_ctx": 10000
-        }}
-    )
-    response.raise_for_status()
-    
-    return response.json().get("response", "No summary provided") 
+    return generate(prompt, default="No summary provided")
 
-def get_rolling_summary(md: str, chunk_size=2000, overlap=0, max_summary_len=500):
+def get_rolling_summary(md, chunk_size=2000, overlap=0, max_summary_len=500, state=None, on_step=None):
     """
     Generates summary for a given file using a rolling technique to deal with the large size
     
     Args:
-        md (str): markdown content of file
+        md (str | iterable): markdown content of file, or its consecutive text blocks
+        state (dict): {"step", "current", "previous"} of an interrupted run; its steps are skipped.
+        on_step (callable): Called with that state after every step.
     
     Returns:
         str: AI-generated summary.
     """
-    print(chunk_size, overlap, max_summary_len)
-
-    chunks = chunk_text(md, chunk_size, overlap)
+    # chunks are cut lazily, md may be read block by block
+    chunks = iter_chunks(md, chunk_size, overlap)
 
-    current_summary = ""
-    previous_summary = ""
+    current_summary = state["current"] if state else ""
+    previous_summary = state["previous"] if state else ""
+    done = state["step"] if state else 0
 
     i = 0
     for chunk in tqdm.tqdm(chunks):
-        if i == 0:
-            current_summary = _get_summary(chunk)
-            i += 1
-        else:
-            summary = get_joint_summary_input(current_summary, previous_summary, chunk, max_summary_len)
-            previous_summary = current_summary
-            current_summary = summary
+        if i < done:
             i += 1
+            continue
+        count("summary.chunks")
+        with span("summary.step", step=i):
+            if i == 0:
+                current_summary = _get_summary(chunk)
+                i += 1
+            else:
+                summary = get_joint_summary_input(current_summary, previous_summary, chunk, max_summary_len)
+                previous_summary = current_summary
+                current_summary = summary
+                i += 1
 
-        print("########", i, current_summary)
+        if on_step is not None:
+            on_step({"step": i, "current": current_summary, "previous": previous_summary})
     
     return current_summary
+
+def get_merged_summary(summaries, max_summary_len):
+    """
+    Merges the summaries of consecutive parts of a document into one
+    
+    Args:
+        summaries (list): summaries of consecutive parts, in document order
+        max_summary_len (int): max number of characters of the merged summary
+    
+    Returns:
+        str: AI-generated summary.
+    """
+
+    parts = "\n".join(f"""
+        PART {i + 1}:
+        {summary}
+    """ for i, summary in enumerate(summaries))
+
+    prompt = f"""
+        The following are summaries of consecutive parts of the same document:
+        {parts}
+            
+        Create a single summary of these parts that:
+            1. Maintains approximately {max_summary_len} characters or less
+            2. Keeps the information that matters for the document as a whole
+            3. Follows the order of the parts
+            4. Resolves any contradictions between the parts
+            5. Reads as a single coherent summary
+    """
+
+    return generate(prompt, default="No summary provided")
+
+# chunk summaries between two calls of on_step in the map-reduce strategy, at least
+MAP_STEP = 16
+
+def _map_window(pool, fn, items, window):
+    """Like `pool.map`, but only takes `window` items ahead from the (lazy) iterable."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def get_map_reduce_summary(md, chunk_size=2000, overlap=0, max_summary_len=500, fan_in=4, state=None, on_step=None):
+    """
+    Generates summary for a given file by summarizing its chunks concurrently
+    and merging the summaries `fan_in` at a time, in a tree of logarithmic depth
+    
+    Args:
+        md (str | iterable): markdown content of file, or its consecutive text blocks
+        state (dict): {"mapped"} of an interrupted run: the summaries of the first chunks, not summarized again.
+        on_step (callable): Called with that state as chunk summaries are added: after
+            MAP_STEP of them, or an eighth of those so far if more, so that the
+            states written add up to a size linear in the number of chunks.
+    
+    Returns:
+        str: AI-generated summary.
+    """
+    if fan_in < 2:
+        raise ValueError(f"fan_in must be at least 2 to merge summaries, got {fan_in}.")
+    summaries = list(state["mapped"]) if state else []
+    saved = len(summaries)
+    chunks = itertools.islice(iter_chunks(md, chunk_size, overlap), len(summaries), None)
+
+    # the llm semaphore bounds the requests in flight, the pool only has to keep it busy
+    with ThreadPoolExecutor(max_workers=max(1, LLM_CONCURRENCY)) as pool:
+        with span("summary.map"):
+            for summary in tqdm.tqdm(_map_window(pool, _get_summary, chunks, 2 * max(1, LLM_CONCURRENCY))):
+                summaries.append(summary)
+                count("summary.chunks")
+                if on_step is not None and len(summaries) - saved >= max(MAP_STEP, len(summaries) // 8):
+                    on_step({"mapped": summaries})
+                    saved = len(summaries)
+        if not summaries:
+            return ""
+
+        while len(summaries) > 1:
+            groups = [summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)]
+            with span("summary.reduce", groups=len(groups)):
+                summaries = list(pool.map(
+                    lambda group: group[0] if len(group) == 1 else get_merged_summary(group, max_summary_len),
+                    groups
+                ))
+
+    return summaries[0]
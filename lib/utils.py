@@ -1,3 +1,5 @@
+import hashlib
+
 def chunk_text(text, chunk_size, overlap=0):
     """
     Splits text into chunks of a specified size with optional overlap.
@@ -10,13 +12,70 @@ def chunk_text(text, chunk_size, overlap=0):
     Returns:
         list: A list of text chunks.
     """
-    chunks = []
+    return list(iter_chunks(text, chunk_size, overlap))
+
+def iter_chunks(text, chunk_size, overlap=0):
+    """
+    Lazily splits text into chunks, like `chunk_text`.
+
+    Only the text of the current chunk (and the block it is read from) is
+    held, so a document read block by block is never in memory as a whole.
+
+    Args:
+        text (str | iterable): The input text, or an iterable of consecutive text blocks.
+        chunk_size (int): The maximum size of each chunk.
+        overlap (int): The number of overlapping characters between chunks.
+
+    Yields:
+        str: The chunks, in order.
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    for block in ([text] if isinstance(text, str) else text):
+        buffer += block
+        start = 0
+        while start + chunk_size <= len(buffer):
+            yield buffer[start:start + chunk_size]
+            start += step  # Move forward but keep overlap
+        buffer = buffer[start:]
+
     start = 0
-    
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start += chunk_size - overlap  # Move forward but keep overlap
-    
-    return chunks
+    while start < len(buffer):
+        yield buffer[start:start + chunk_size]
+        start += step
+
+def batched(iterable, size):
+    """
+    Groups an iterable in lists of `size` items (the last one may be shorter).
+
+    Args:
+        iterable (iterable): The items.
+        size (int): The batch size.
+
+    Yields:
+        list: The batches.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def file_hash(filepath):
+    """
+    Computes the sha256 of a file's content.
+
+    Args:
+        filepath (str): Path to the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()